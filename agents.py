@@ -0,0 +1,115 @@
+import mcts
+import policies
+
+"""
+Computer players
+
+The hard-coded strategies used by the computer in main.py, and the agents that the self-play runner can pit against each other.
+"""
+def get_computer_action(game, computer, search=None, book=None):
+    """
+    Returns the action the computer plays, using an MCTS search weighted by some hard-coded strategies.
+
+    There are also some hardcoded strategies that the computer will prioritise before performing a search.
+    If the position is in the opening book, the book's probabilities are used without searching.
+    If search is None, the weighting is applied to equal probabilities instead.
+    """
+    if game.playable_actions == ("allow",):
+        return "allow"
+
+    # Computer will coup if it has more than 7 coins.
+    # The computer is also asked for its responses to the other player's actions, where it can't coup.
+    if computer.coins >= 7 and "coup" in game.playable_actions:
+        return "coup"
+
+    # Last ditch efforts
+    if game.playable_actions == game.playable_actions == ("allow", "block", "challenge"):
+        if game.current_action == "assassinate" and len(computer.hand) == 1:
+            if "contessa" in computer.hand:
+                return "block"
+            return "challenge"
+
+    # Worst case scenario, computer doesn't have a hardcoded strategy so it will try to find the best move.
+    mcts_probs = book.lookup(game, computer) if book is not None else None
+    if mcts_probs is None and search is not None:
+        mcts_probs = search.search()
+    elif mcts_probs is None:
+        legal_actions = game.get_legal_actions(computer)
+        mcts_probs = [1 / len(legal_actions) if action in legal_actions else 0 for action in game.playable_actions]
+
+    action_prob = {game.playable_actions[i]: mcts_probs[i] for i in range(len(mcts_probs))}
+
+    policies.weight_actions(game, computer, action_prob)
+
+    # The weighting can leave actions with negative weights, which can't be chosen
+    weights = [max(weight, 0) for weight in action_prob.values()]
+    if sum(weights) == 0:
+        return game.rng.choice(game.get_legal_actions(computer))
+    return game.rng.choices(list(action_prob.keys()), weights=weights, k=1)[0]
+
+class RandomAgent:
+    """Plays a random legal action."""
+    name = "random"
+
+    def choose(self, game, player):
+        """Return the action to play."""
+        return game.rng.choice(game.get_legal_actions(player))
+
+    def observe(self, action):
+        """Called with every action played in the game."""
+        pass
+
+class HeuristicAgent(RandomAgent):
+    """Plays with the computer's hard-coded strategies, without searching."""
+    name = "heuristic"
+
+    def choose(self, game, player):
+        """Return the action to play."""
+        return get_computer_action(game, player)
+
+class MCTSAgent(RandomAgent):
+    """Plays like the computer in main.py, searching with MCTS and keeping the tree between decisions."""
+    name = "mcts"
+
+    def __init__(self, args, book=None):
+        """Initialize the agent with the arguments for the search, and optionally an opening book."""
+        self.args = args
+        self.book = book
+        self.search = None
+
+    def choose(self, game, player):
+        """Return the action to play."""
+        if self.search is None or self.search.game is not game:
+            self.search = mcts.MCTS(game, self.args)
+        return get_computer_action(game, player, self.search, self.book)
+
+    def observe(self, action):
+        """Called with every action played in the game."""
+        if self.search is not None:
+            self.search.advance(action)
+
+DEFAULT_MCTS_ARGS = {'C': 1.41, 'num_simulations': 1000, 'max_depth': 100}
+
+def make_agent(spec):
+    """
+    Returns an agent from a description such as "random", "heuristic", "mcts" or "mcts:num_simulations=200,rollout_policy=cutoff".
+    """
+    name, _, options = spec.partition(":")
+    match name:
+        case "random":
+            return RandomAgent()
+        case "heuristic":
+            return HeuristicAgent()
+        case "mcts":
+            args = dict(DEFAULT_MCTS_ARGS)
+            for option in filter(None, options.split(",")):
+                key, value = option.split("=")
+                try:
+                    args[key] = float(value) if "." in value else int(value)
+                except ValueError: # Names, such as the rollout policy
+                    args[key] = value
+            # Agents are already run in worker processes, so each search stays in its own process
+            args['num_workers'] = 1
+            return MCTSAgent(args)
+        case default:
+            raise ValueError(f"Unknown agent: {spec}")
@@ -0,0 +1,160 @@
+import game
+import mcts
+import policies
+import random
+import argparse
+import json
+import platform
+import time
+from copy import deepcopy
+
+try:
+    import rollouts
+except ImportError: # NumPy is not installed
+    rollouts = None
+
+"""
+Benchmarks
+
+Measures the speed of the game engine and the search from fixed seeds, and writes the results as JSON
+so that the results of two commits can be compared.
+"""
+SEARCH_SETTINGS = [
+    {'num_simulations': 100, 'max_depth': 20},
+    {'num_simulations': 100, 'max_depth': 100},
+    {'num_simulations': 1000, 'max_depth': 20},
+    {'num_simulations': 1000, 'max_depth': 100},
+]
+
+def make_game(seed):
+    """
+    Returns a silent game with dealt hands at the start of the first turn.
+    """
+    coup = game.Game(output=None, rng=random.Random(seed))
+    coup.is_simulation = True
+    coup.deal()
+    coup.playable_actions = coup.get_playable_actions()
+    return coup
+
+def measure(function, repeats):
+    """
+    Call function repeats times and return the mean and minimum time of a call, in seconds.
+    """
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"mean": sum(times) / len(times), "min": min(times)}
+
+def bench_play_action(seed, steps):
+    """
+    Play random playable actions, starting a new game whenever one is won, and return the actions played per second.
+    """
+    coup = make_game(seed)
+    start = time.perf_counter()
+    for i in range(steps):
+        if coup.game_won:
+            coup = make_game(seed + i)
+        player = coup.turn
+        coup.play_action(player, coup.get_opponent(player), coup.rng.choice(coup.playable_actions))
+    elapsed = time.perf_counter() - start
+    return {"steps": steps, "actions_per_second": steps / elapsed}
+
+def bench_copies(seed, repeats):
+    """
+    Returns the time in microseconds of copying the game with clone() and deepcopy(), and of get_next_state().
+    """
+    coup = make_game(seed)
+    results = {}
+    for name, function in [
+        ("clone", coup.clone),
+        ("deepcopy", lambda: deepcopy(coup)),
+        ("get_next_state", lambda: coup.get_next_state(coup.turn, "income")),
+    ]:
+        start = time.perf_counter()
+        for i in range(repeats):
+            function()
+        results[f"{name}_us"] = (time.perf_counter() - start) / repeats * 1e6
+    return results
+
+def bench_simulate(seed, num_rollouts, max_depth):
+    """
+    Returns the rollouts per second of policies.rollout, and of batched rollouts if NumPy is installed.
+    """
+    coup = make_game(seed)
+    start = time.perf_counter()
+    for i in range(num_rollouts):
+        policies.rollout(coup, max_depth)
+    results = {"max_depth": max_depth, "rollouts_per_second": num_rollouts / (time.perf_counter() - start)}
+
+    if rollouts is not None:
+        start = time.perf_counter()
+        rollouts.simulate(coup, num_rollouts, max_depth)
+        results["batch_rollouts_per_second"] = num_rollouts / (time.perf_counter() - start)
+    return results
+
+def bench_search(seed, settings, repeats):
+    """
+    Returns the latency of MCTS.search with the settings, in seconds. Every search is seeded with seed, so each repeat runs the same search.
+    """
+    coup = make_game(seed)
+    results = []
+    for setting in settings:
+        args = dict({'C': 1.41, 'seed': seed}, **setting)
+        results.append(dict(setting, **measure(lambda: mcts.MCTS(coup, args).search(), repeats)))
+    return results
+
+def run(seed=0, quick=False):
+    """
+    Run every benchmark and return the results as a dictionary.
+    """
+    scale = 10 if quick else 1
+    settings = SEARCH_SETTINGS[:1] if quick else SEARCH_SETTINGS
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "play_action": bench_play_action(seed, 100000 // scale),
+        "copies": bench_copies(seed, 10000 // scale),
+        "simulate": [bench_simulate(seed, 2000 // scale, max_depth) for max_depth in (20, 100)],
+        "search": bench_search(seed, settings, 5 if not quick else 1),
+    }
+
+def compare(old, new):
+    """
+    Returns lines describing the change of each result from old to new, as a percentage.
+    """
+    lines = []
+    def walk(old, new, path):
+        if isinstance(new, dict):
+            for key in new:
+                if key in old:
+                    walk(old[key], new[key], f"{path}.{key}" if path else key)
+        elif isinstance(new, list):
+            for index, (old_item, new_item) in enumerate(zip(old, new)):
+                walk(old_item, new_item, f"{path}[{index}]")
+        elif isinstance(new, float) and old:
+            lines.append(f"{path}: {old:.6g} -> {new:.6g} ({(new - old) / old:+.1%})")
+    walk(old, new, "")
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the game engine and the search.")
+    parser.add_argument("-s", "--seed", help="Seed for the benchmarks", type=int, default=0)
+    parser.add_argument("-q", "--quick", help="Run smaller benchmarks", action="store_true")
+    parser.add_argument("-o", "--output", help="File to write the results to, instead of printing them")
+    parser.add_argument("-c", "--compare", help="Results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = run(args.seed, args.quick)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+
+    if args.compare:
+        with open(args.compare) as file:
+            for line in compare(json.load(file), results):
+                print(line)
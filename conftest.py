@@ -0,0 +1,29 @@
+import pytest
+import game
+import random
+
+@pytest.fixture
+def deal():
+    """
+    Returns a function that deals a silent simulation game from a seed, with the first player to play.
+    The players are dealt the hands given, one list of cards per player, and random cards otherwise.
+    """
+    def deal(seed=0, hands=()):
+        coup = game.Game(output=None, rng=random.Random(seed))
+        coup.is_simulation = True
+        for player, hand in zip(coup.players, hands):
+            player.hand = list(hand)
+            for card in hand:
+                coup.deck.remove(card)
+        coup.deal()
+        coup.reset_flags()
+        return coup
+    return deal
+
+@pytest.fixture
+def coup(deal):
+    """A dealt game where the second player, with the assassin and contessa, plays against the duke and captain."""
+    coup = deal(hands=(["duke", "captain"], ["assassin", "contessa"]))
+    coup.turn = coup.players[1]
+    coup.reset_flags()
+    return coup
@@ -1,29 +1,20 @@
+import copy
 import random
-from copy import deepcopy
-from contextlib import contextmanager
-import sys, os
 import pprint
 
-# Code from: https://thesmithfam.org/blog/2012/10/25/temporarily-suppress-console-output-in-python/
-@contextmanager
-def suppress_stdout():
-    """
-    Suppresses stdout for the duration of the context. 
-    This is for copying the game state and playing out an action without printing to the console.
-    """
-    with open(os.devnull, "w") as devnull:
-        old_stdout = sys.stdout
-        sys.stdout = devnull
-        try:  
-            yield
-        finally:
-            sys.stdout = old_stdout
+CARDS = ("duke", "assassin", "ambassador", "captain", "contessa")
+ACTIONS = ("coup", "income", "foreign_aid", "tax", "steal", "assassinate", "exchange", "allow", "challenge", "block")
+CARD_INDEX = {card: index for index, card in enumerate(CARDS)}
+ACTION_INDEX = {action: index for index, action in enumerate(ACTIONS)}
+TURN_ACTIONS = ACTIONS[:7]
 
 class Game():
     """Game of Coup."""
 
     class Player():
         """A player in the game."""
+        __slots__ = ("name", "hand", "coins")
+
         def __init__(self, name):
             """Initialize the player."""
             self.name = name
@@ -40,6 +31,14 @@ class Game():
                 return
             self.hand.remove(card)
 
+        def clone(self):
+            """Return a copy of the player that shares no mutable state with the original."""
+            other = Game.Player.__new__(Game.Player)
+            other.name = self.name
+            other.hand = self.hand[:]
+            other.coins = self.coins
+            return other
+
         def print_information(self):
             """print information about the player."""
             return f"{self.name} has {self.coins} coins and {self.hand} in their hand."
@@ -56,21 +55,158 @@ class Game():
             """Return whether the player is equal to a name."""
             return self.name == name
         
-    def __init__(self):
-        """Initialize the game."""
+    class Deck():
+        """
+        The court deck, stored as the number of each card in CARDS.
+
+        The deck has no order, so cards are drawn at random, weighted by their counts, rather than shuffled.
+        """
+        __slots__ = ("counts", "size")
+
+        def __init__(self, cards=()):
+            """Initialize the deck with the cards."""
+            self.counts = [0] * len(CARDS)
+            self.size = 0
+            for card in cards:
+                self.append(card)
+
+        def clone(self):
+            """Return a copy of the deck."""
+            other = Game.Deck.__new__(Game.Deck)
+            other.counts = self.counts[:]
+            other.size = self.size
+            return other
+
+        def append(self, card):
+            """Add a card to the deck."""
+            self.counts[CARD_INDEX[card]] += 1
+            self.size += 1
+
+        def remove(self, card):
+            """Remove a card from the deck. Raises ValueError if the deck doesn't have the card."""
+            index = CARD_INDEX[card]
+            if self.counts[index] == 0:
+                raise ValueError(f"{card} is not in the deck")
+            self.counts[index] -= 1
+            self.size -= 1
+
+        def draw(self, rng=random):
+            """
+            Remove a random card from the deck and return it, drawn with rng. Raises IndexError if the deck is empty.
+            """
+            card = self.peek(rng=rng)
+            self.counts[CARD_INDEX[card]] -= 1
+            self.size -= 1
+            return card
+
+        def peek(self, num_cards=None, rng=random):
+            """
+            Return a random card from the deck without removing it, or a list of num_cards different cards of the deck.
+            """
+            if num_cards is not None:
+                deck = self.clone()
+                return [deck.draw(rng) for i in range(min(num_cards, self.size))]
+            if self.size == 0:
+                raise IndexError("draw from an empty deck")
+            pick = rng.randrange(self.size)
+            for index, count in enumerate(self.counts):
+                if pick < count:
+                    return CARDS[index]
+                pick -= count
+
+        def __contains__(self, card):
+            return self.counts[CARD_INDEX[card]] > 0
+
+        def __len__(self):
+            return self.size
+
+        def __iter__(self):
+            """Iterate over the cards, in the order of CARDS."""
+            for card, count in zip(CARDS, self.counts):
+                for i in range(count):
+                    yield card
+
+        def __repr__(self):
+            return repr(list(self))
+
+    # The state of a game is small and fixed in size, so it is stored in slots
+    # and copied field by field in clone() rather than with deepcopy.
+    __slots__ = (
+        "players", "is_simulation", "output", "deck", "round", "turn", "current_action",
+        "game_won", "winner", "playable_actions", "block_attempted", "challenge_attempted", "rng", "recorder",
+    )
+
+    blockable_actions = ("assassinate", "steal", "foreign_aid")
+    challengeable_actions = ("tax", "assassinate", "steal", "exchange", "block")
+
+    def __init__(self, output=print, rng=None):
+        """
+        Initialize the game.
+
+        Messages about the game are passed to output, which defaults to print. Pass None to play silently.
+        Cards and the choices of simulations are drawn with rng, a random.Random. By default the game gets its own,
+        seeded from the random module, so random.seed() still makes games repeatable.
+        """
         self.players = [self.Player("Player"), self.Player("Computer")]
         self.is_simulation = False
-        self.deck = ["duke", "assassin", "ambassador", "captain", "contessa"] * 3
+        self.output = output
+        self.deck = self.Deck(CARDS * 3)
         self.round = 0
         self.turn = self.players[0]
         self.current_action = ""
         self.game_won = False
         self.winner = ""
         self.playable_actions = []
-        self.blockable_actions = ["assassinate", "steal", "foreign_aid"]
-        self.challengeable_actions = ["tax", "assassinate", "steal", "exchange", "block"]
         self.block_attempted = False
         self.challenge_attempted = False
+        self.rng = rng if rng is not None else random.Random(random.getrandbits(64))
+        self.recorder = None
+
+    def clone(self):
+        """
+        Returns a copy of the game that can be played out without affecting the original.
+
+        This is used in place of deepcopy by the MCTS, which copies the game for every expansion and rollout.
+        The copy shares the random generator of the original, but isn't recorded.
+        """
+        other = Game.__new__(Game)
+        other.players = [player.clone() for player in self.players]
+        other.is_simulation = self.is_simulation
+        other.output = self.output
+        other.deck = self.deck.clone()
+        other.round = self.round
+        other.turn = other.players[self.players.index(self.turn)]
+        other.current_action = self.current_action
+        other.game_won = self.game_won
+        other.winner = other.players[self.players.index(self.winner)] if self.winner else ""
+        other.playable_actions = self.playable_actions
+        other.block_attempted = self.block_attempted
+        other.challenge_attempted = self.challenge_attempted
+        other.rng = self.rng
+        other.recorder = None
+        return other
+
+    def __deepcopy__(self, memo):
+        """
+        Copy the game with clone(), but with a random generator of its own, in the same state as the original's, so
+        that the copy is independent of the original. Like a clone, the copy isn't recorded.
+        """
+        other = self.clone()
+        memo[id(self)] = other
+        other.rng = random.Random()
+        other.rng.setstate(self.rng.getstate())
+        other.playable_actions = copy.deepcopy(self.playable_actions, memo)
+        return other
+
+    def log(self, message, *args):
+        """
+        Send a message to the game's output.
+
+        The message is only formatted with args when it will be shown, so simulations, which are silent, never build any strings.
+        """
+        if self.is_simulation or self.output is None:
+            return
+        self.output(message.format(*args) if args else message)
 
     def add_player(self, name):
         """Add a player to the game."""
@@ -83,49 +219,44 @@ class Game():
     def initial_draw(self):
         """Initial draw. Shuffle the deck and each the player choose two cards from the top three cards, as per the rules of two-player Coup."""
         for player in self.players:
-            random.shuffle(self.deck)
-            draw = self.deck[:3]
-            print(f"{player.name} choose a card from {draw} by entering the index of the card.")
+            draw = self.deck.peek(3, rng=self.rng)
+            self.log("{} choose a card from {} by entering the index of the card.", player.name, draw)
             while True:
                 try:
                     card = int(input())
                     player.hand.append(draw[card])
-                    print(f"{player.name} chose {draw[card]}")
+                    self.log("{} chose {}", player.name, draw[card])
                     draw.pop(card)
                     break
                 except ValueError:
-                    print("Invalid input. Try again.")
+                    self.log("Invalid input. Try again.")
             for card in draw:
                 self.deck.append(card)
                 draw.remove(card)
-            random.shuffle(self.deck)
-            player.hand.append(self.deck.pop())
+            player.hand.append(self.deck.draw(self.rng))
 
     def initial_draw_computer(self):
         """Initial draw if playing against a computer."""
         # Player
-        random.shuffle(self.deck)
-        draw = self.deck[:3]
-        print(f"{self.players[0]} choose a card from {draw} by entering the index of the card.")
+        draw = self.deck.peek(3, rng=self.rng)
+        self.log("{} choose a card from {} by entering the index of the card.", self.players[0], draw)
         while True:
             try:
                 card = int(input())
                 self.players[0].hand.append(draw[card])
-                print(f"{self.players[0]} chose {draw[card]}")
+                self.log("{} chose {}", self.players[0], draw[card])
                 draw.pop(card)
                 break
             except ValueError:
-                print("Invalid input. Try again.")
+                self.log("Invalid input. Try again.")
         for card in draw:
             self.deck.append(card)
             draw.remove(card)
-        random.shuffle(self.deck)
-        self.players[0].hand.append(self.deck.pop())
+        self.players[0].hand.append(self.deck.draw(self.rng))
 
         # Computer
-        random.shuffle(self.deck)
-        draw = self.deck[:3]
-        print("Computer is choosing their initial card...")
+        draw = self.deck.peek(3, rng=self.rng)
+        self.log("Computer is choosing their initial card...")
 
         # Computer will prioritise the duke, then the assassin, then a random card
         if "duke" in draw:
@@ -133,38 +264,41 @@ class Game():
         elif "assassin" in draw:
             card = draw.index("assassin")
         else:
-            card = random.randint(0, 2)
+            card = self.rng.randint(0, 2)
         self.players[1].hand.append(draw[card])
 ##        print(f"{self.players[1]} chose {draw[card]}")
         draw.pop(card)
         for card in draw:
             self.deck.append(card)
             draw.remove(card)
-        random.shuffle(self.deck)
-        self.players[1].hand.append(self.deck.pop())
+        self.players[1].hand.append(self.deck.draw(self.rng))
     
+    def deal(self):
+        """Initial draw without any input. Deal two random cards to each player."""
+        for player in self.players:
+            while len(player.hand) < 2:
+                player.hand.append(self.deck.draw(self.rng))
+
     def get_playable_actions(self, action=None):
         """
-        Returns a list of playable actions based on the current action.
+        Returns a tuple of playable actions based on the current action, from PLAYABLE_ACTIONS.
         """
         match action:
-            case None:
-                return ["coup", "income", "foreign_aid", "tax", "steal", "assassinate", "exchange"]
             case "block":
                 self.block_attempted = True
-                return ["allow", "challenge"]
             case "challenge":
                 self.challenge_attempted = True
-                return ["coup", "income", "foreign_aid", "tax", "steal", "assassinate", "exchange"]
-            case default:
-                if action in self.challengeable_actions and action in self.blockable_actions:
-                    return ["allow", "challenge", "block"]
-                elif action in self.challengeable_actions:
-                    return ["allow", "challenge"]
-                elif action in self.blockable_actions:
-                    return ["allow", "block"]
-                else:
-                    return ["allow"]
+        return PLAYABLE_ACTIONS.get(action, ("allow",))
+
+    def get_legal_actions(self, player):
+        """
+        Returns a tuple of the playable actions that the player has enough coins to play, from LEGAL_ACTIONS.
+        """
+        bracket = get_coin_bracket(player.coins)
+        legal_actions = LEGAL_ACTIONS.get((tuple(self.playable_actions), bracket))
+        if legal_actions is None: # Actions that were set by hand, in an order that isn't in the table
+            legal_actions = get_affordable_actions(self.playable_actions, bracket)
+        return legal_actions
     """
     Game actions
     """
@@ -184,25 +318,25 @@ class Game():
                 elif "contessa" in target.hand:
                     card = (target.hand.index("contessa") + 1) % len(target.hand)
                 else:
-                    card = random.randint(0, len(target.hand) - 1)
-                print(f"{target} lost {card}")
+                    card = self.rng.randint(0, len(target.hand) - 1)
+                self.log("{} lost {}", target, card)
                 target.hand.pop(card)
                 return
             else: 
-                print(f"{target} choose a card to lose by entering the index of the card.")
+                self.log("{} choose a card to lose by entering the index of the card.", target)
                 while True:
                     try:
                         card = int(input())
-                        print(f"{target} lost {target.hand[card]}")
+                        self.log("{} lost {}", target, target.hand[card])
                         target.hand.pop(card)
                         break
                     except IndexError:
-                        print("Invalid input. Try again.")
+                        self.log("Invalid input. Try again.")
                     except ValueError:
-                            print("Invalid input. Try again.")
+                            self.log("Invalid input. Try again.")
         else:
-            card = random.randint(0, len(target.hand) - 1)
-            print(f"{target} lost {target.hand[card]}")
+            card = self.rng.randint(0, len(target.hand) - 1)
+            self.log("{} lost {}", target, target.hand[card])
             target.hand.pop(card)
 
     def coup(self, player, target):
@@ -212,9 +346,9 @@ class Game():
         Coup a player by paying 7 coins. The target must choose a card to lose.
         """
         if player.coins < 7:
-            print("You don't have enough coins to coup.")
+            self.log("You don't have enough coins to coup.")
             return
-        print(f"{player} coup {target}!")
+        self.log("{} coup {}!", player, target)
         player.coins -= 7
         self.lose_card(target)
     
@@ -223,21 +357,21 @@ class Game():
         Gain 1 coin.
         """
         player.coins += 1
-        print(f"{player} gained 1 coin.")
+        self.log("{} gained 1 coin.", player)
 
     def foreign_aid(self, player):
         """
         Gain 2 coins.
         """
         player.coins += 2
-        print(f"{player} gained 2 coins.")
+        self.log("{} gained 2 coins.", player)
 
     def tax(self, player):
         """
         Duke influence. Gain 3 coins.
         """
         player.coins += 3
-        print(f"{player} gained 3 coins.")
+        self.log("{} gained 3 coins.", player)
 
     def assassinate(self, player, target):
         """
@@ -248,15 +382,15 @@ class Game():
         Assassinate can be blocked by the Contessa.
         """
         if len(target.hand) == 0:
-            print("Target has no cards.")
+            self.log("Target has no cards.")
             return
         if player.coins < 3:
-            print("You don't have enough coins to assassinate.")
+            self.log("You don't have enough coins to assassinate.")
             return
-        print(f"{player} assassinate {target}!")
+        self.log("{} assassinate {}!", player, target)
         player.coins -= 3
         if len(target.hand) == 1:
-            print(f"{target} lost {target.hand[0]}")
+            self.log("{} lost {}", target, target.hand[0])
             target.hand.pop(0)
             return
         self.lose_card(target)
@@ -269,8 +403,7 @@ class Game():
         if len(player.hand) == 0:
             return
         
-        random.shuffle(self.deck)
-        top = self.deck[:len(player.hand)]
+        top = self.deck.peek(len(player.hand), rng=self.rng)
         if not self.is_simulation:
             if player.name == "Computer":
                 if "duke" in top:
@@ -278,22 +411,22 @@ class Game():
                 elif "assassin" in top:
                     card = top.index("assassin")
                 else:
-                    card = random.randint(0, len(top) - 1)
+                    card = self.rng.randint(0, len(top) - 1)
                 
                 if "ambassador" in player.hand:
                     card_to_replace = player.hand.index("ambassador")
                 elif "contessa" in player.hand:
                     card_to_replace = player.hand.index("contessa")
                 else:
-                    card_to_replace = random.randint(0, len(player.hand) - 1)
+                    card_to_replace = self.rng.randint(0, len(player.hand) - 1)
 
                 player.hand.append(top.pop(card))
                 top.append(player.hand.pop(card_to_replace))
-                print(f"{player} exchanged cards!")
+                self.log("{} exchanged cards!", player)
             
             else:
                 while True:
-                    print(f"{player} exchange {player.hand} with {top} by entering the index of the card to replace and the card to swap with, if any.")
+                    self.log("{} exchange {} with {} by entering the index of the card to replace and the card to swap with, if any.", player, player.hand, top)
                     try:
                         match input("Keep hand? (y/n): "):
                             case "y":
@@ -304,24 +437,24 @@ class Game():
                         card = int(input("Card to swap with: "))
                         player.hand.append(top.pop(card))
                         top.append(player.hand.pop(card_to_replace))
-                        print(f"{player} exchanged {top[card]} with {player.hand[card_to_replace]}")
+                        self.log("{} exchanged {} with {}", player, top[card], player.hand[card_to_replace])
                     except ValueError:
-                            print("Invalid input. Try again.") 
+                            self.log("Invalid input. Try again.")
         else:
-            card = random.randint(0, len(top) - 1)
-            card_to_replace = random.randint(0, len(player.hand) - 1)
+            card = self.rng.randint(0, len(top) - 1)
+            card_to_replace = self.rng.randint(0, len(player.hand) - 1)
             player.hand.append(top.pop(card))
             top.append(player.hand.pop(card_to_replace))
-            print(f"{player} exchanged cards!")
+            self.log("{} exchanged cards!", player)
 
     def steal(self, player, target):
         """
         Captain influence. Steal up to 2 coins from a target.
         """
         if target.coins == 0:
-            print(f"{target} has no coins to steal.")
+            self.log("{} has no coins to steal.", target)
             return
-        print(f"{player} steal from {target}!")
+        self.log("{} steal from {}!", player, target)
         coins_stolen = 0
         for i in range(2):
             if target.coins == 0:
@@ -329,7 +462,7 @@ class Game():
             coins_stolen += 1
             target.coins -= 1
         player.coins += coins_stolen
-        print(f"{player} gained {coins_stolen} coins.")
+        self.log("{} gained {} coins.", player, coins_stolen)
 
     def block(self, player, target, action):
         """
@@ -342,48 +475,46 @@ class Game():
             steal           by the ambassador or captain
             foreign_aid     by the duke
         """
-        print("Processing block...")
+        self.log("Processing block...")
         if self.challenge_attempted:
             match action:
                 case "assassinate":
                     if "contessa" in target.hand:
-                        print(f"{target} had the contessa and blocked the assassination! The challenge was unsuccessful!")
+                        self.log("{} had the contessa and blocked the assassination! The challenge was unsuccessful!", target)
                         self.lose_card(player)
+                        # The card is returned to the deck and drawn straight back
                         target.remove_card("contessa")
-                        self.deck.append("contessa")
-                        target.add_card(self.deck.pop())
+                        target.add_card("contessa")
                     else:
-                        print(f"{target} didn't have the contessa and the challenge was successful!")
+                        self.log("{} didn't have the contessa and the challenge was successful!", target)
                         self.lose_card(target)
                 case "steal":
                     if "ambassador" in target.hand or "captain" in target.hand:
-                        print(f"{target} had the ambassador or captain and blocked the steal! The challenge was unsuccessful!")
+                        self.log("{} had the ambassador or captain and blocked the steal! The challenge was unsuccessful!", target)
                         self.lose_card(player)
                         if "ambassador" in target.hand:
                             target.remove_card("ambassador")
-                            self.deck.append("ambassador")
+                            target.add_card("ambassador")
                         elif "captain" in target.hand:
                             target.remove_card("captain")
-                            self.deck.append("captain")
-                        target.add_card(self.deck.pop())
+                            target.add_card("captain")
                     else:
-                        print(f"{target} didn't have the ambassador or captain and the challenge was successful!")
+                        self.log("{} didn't have the ambassador or captain and the challenge was successful!", target)
                         self.lose_card(target)
                 case "foreign_aid":
                     if "duke" in target.hand:
-                        print(f"{player} had the duke and blocked the foreign aid! The challenge was unsuccessful!")
+                        self.log("{} had the duke and blocked the foreign aid! The challenge was unsuccessful!", player)
                         self.lose_card(target)
                         player.remove_card("duke")
-                        self.deck.append("duke")
-                        player.add_card(self.deck.pop())
+                        player.add_card("duke")
                     else:
-                        print(f"{target} didn't have duke and the challenge was successful!")
+                        self.log("{} didn't have duke and the challenge was successful!", target)
                         self.lose_card(target)
                 case default:
-                    print(f"{player} did not have the card to block the action! The challenge was unsuccessful!")
+                    self.log("{} did not have the card to block the action! The challenge was unsuccessful!", player)
                     self.lose_card(target)
         else:
-            print(f"{target} blocked the action!")
+            self.log("{} blocked the action!", target)
     
     def challenge(self, player, target, action):
         """
@@ -393,54 +524,54 @@ class Game():
         
         Return True if the challenge was successful, False otherwise.
         """
-        print("Processing challenge...")
+        self.log("Processing challenge...")
         match action:
             case "tax":
                 if "duke" in player.hand:
-                    print(f"{player} had the duke! The tax was successful!")
+                    self.log("{} had the duke! The tax was successful!", player)
                     self.lose_card(target)
                     player.remove_card("duke")
-                    player.add_card(self.deck.pop())
+                    player.add_card(self.deck.draw(self.rng))
                     self.deck.append("duke")
                     return False
                 else:
-                    print(f"{player} did not have the duke! The challenge was successful!")
+                    self.log("{} did not have the duke! The challenge was successful!", player)
                     self.lose_card(player)
                     return True
             case "steal":
                 if "captain" in player.hand:
-                    print(f"{player} had the captain! The steal was successful!")
+                    self.log("{} had the captain! The steal was successful!", player)
                     player.remove_card("captain")
-                    player.add_card(self.deck.pop())
+                    player.add_card(self.deck.draw(self.rng))
                     self.deck.append("captain")
                     self.lose_card(target)
                     return False
                 else:
-                    print(f"{player} did not have the captain! The challenge was successful!")
+                    self.log("{} did not have the captain! The challenge was successful!", player)
                     self.lose_card(player)
                     return True
             case "exchange":
                 if "ambassador" in player.hand:
-                    print(f"{player} had the ambassador! The exchange was successful!")
+                    self.log("{} had the ambassador! The exchange was successful!", player)
                     self.lose_card(target)
                     player.remove_card("ambassador")
-                    player.add_card(self.deck.pop())
+                    player.add_card(self.deck.draw(self.rng))
                     self.deck.append("ambassador")
                     return False
                 else:
-                    print(f"{player} did not have the ambassador! The challenge was successful!")
+                    self.log("{} did not have the ambassador! The challenge was successful!", player)
                     self.lose_card(player)
                     return True
             case "assassinate":
                 if "assassin" in player.hand:
-                    print(f"{player} had the assassin! The assassination was successful!")
+                    self.log("{} had the assassin! The assassination was successful!", player)
                     player.remove_card("assassin")
-                    player.add_card(self.deck.pop())
+                    player.add_card(self.deck.draw(self.rng))
                     self.deck.append("assassin")
                     self.lose_card(target)
                     return False
                 else:
-                    print(f"{player} did not have the assassin! The challenge was successful!")
+                    self.log("{} did not have the assassin! The challenge was successful!", player)
                     self.lose_card(player)
                     return True
             case default:
@@ -449,7 +580,11 @@ class Game():
     def play_action(self, player=None, target=None, action="allow"):
         """
         Process the playing of an action.
+
+        If the game has a recorder (see records.GameRecord), it is given the action before the action is played.
         """
+        if self.recorder is not None:
+            self.recorder.record(self, action)
         match action:
             case "coup" | "income" | "foreign_aid" | "tax" | "exchange" | "assassinate" | "steal":
                 self.current_action = action
@@ -459,7 +594,10 @@ class Game():
                 self.playable_actions = self.get_playable_actions(action)
             case "challenge":
                 self.challenge_attempted = True
+                # The challenge is resolved as an allow, which isn't recorded as it wasn't played
+                recorder, self.recorder = self.recorder, None
                 self.play_action(player, target)
+                self.recorder = recorder
             case default:
                 if self.block_attempted: # If block is attempted, attempt block 
                     self.block(player, target, self.current_action)
@@ -490,9 +628,27 @@ class Game():
         if winner:
             self.winner = winner
 
-            
+    def apply(self, action):
+        """
+        Play an action for the player whose turn it is, and start the next turn if the action finished this one.
+
+        The player whose turn it is chooses the action, but a response is played by the player who took the turn's
+        action: the player choosing, who responds to a block, or otherwise their opponent. The opponent of the player
+        who took the action takes the next turn.
+
+        Returns the player who took the turn's action.
+        """
+        if self.current_action == "":
+            actor = self.turn
+            self.play_action(action=action)
+            return actor
+        actor = self.turn if self.block_attempted else self.get_opponent(self.turn)
+        self.play_action(actor, self.get_opponent(actor), action)
+        if self.current_action == "" and not self.game_won:
+            self.turn = self.get_opponent(actor)
+            self.reset_flags()
+        return actor
 
-    
     def reset_flags(self):
         """
         Reset all flags.
@@ -531,16 +687,106 @@ class Game():
             "current_action": self.current_action,
         }
     
+    def get_state_key(self):
+        """
+        Returns a hashable key of the state, including the hidden information, that is equal for games in the same position.
+
+        The round is left out, as it doesn't affect the rest of the game.
+        """
+        return (
+            self.players.index(self.turn),
+            self.current_action,
+            self.block_attempted,
+            self.challenge_attempted,
+            tuple(self.playable_actions),
+            tuple((player.coins, tuple(sorted(player.hand))) for player in self.players),
+            tuple(self.deck.counts),
+        )
+
+    def get_information_key(self, observer):
+        """
+        Returns a hashable key of what the player at index observer can see of the state: their own cards, and the coins and number of cards of each player.
+
+        Games that the player can't tell apart have the same key.
+        """
+        return (
+            observer,
+            self.players.index(self.turn),
+            self.current_action,
+            self.block_attempted,
+            self.challenge_attempted,
+            tuple(self.playable_actions),
+            tuple(sorted(self.players[observer].hand)),
+            tuple((player.coins, len(player.hand)) for player in self.players),
+        )
+
+    def make_move(self, player, target, action):
+        """
+        Play an action like play_action, and return a record that unmake_move can undo it with. If the action raises
+        an exception, it is undone before the exception is raised.
+
+        The record holds what the action can change: the turn and round, the phase flags, the coins and hands of the
+        players, the deck, and whether the game is won.
+        """
+        record = (
+            self.turn,
+            self.round,
+            self.current_action,
+            self.playable_actions,
+            self.block_attempted,
+            self.challenge_attempted,
+            self.game_won,
+            self.winner,
+            [(player.coins, player.hand[:]) for player in self.players],
+            self.deck.counts[:],
+            self.deck.size,
+        )
+        try:
+            self.play_action(player, target, action)
+        except BaseException:
+            # Leave the game as it was rather than half played
+            self.unmake_move(record)
+            raise
+        return record
+
+    def unmake_move(self, record):
+        """
+        Undo an action played with make_move, from the record it returned.
+        """
+        (
+            self.turn,
+            self.round,
+            self.current_action,
+            self.playable_actions,
+            self.block_attempted,
+            self.challenge_attempted,
+            self.game_won,
+            self.winner,
+            players,
+            self.deck.counts,
+            self.deck.size,
+        ) = record
+        for player, (coins, hand) in zip(self.players, players):
+            player.coins = coins
+            player.hand = hand
+
     def get_next_state(self, player, action):
         """
         Returns the state after an action is played.
-        """
-        temp = deepcopy(self)
-        temp.is_simulation = True
-        opponent = temp.players[(temp.players.index(player) + 1) % len(temp.players)]
-        temp.play_action(player=player, target=opponent, action=action)
-        next_game_state = temp.get_game_state(player)
-        return next_game_state
+
+        The action is played on the game itself with make_move, and undone once the state has been read, even if
+        reading it fails. The state of the random generator is restored too, so the game's later draws are unchanged.
+        """
+        is_simulation, recorder, rng_state = self.is_simulation, self.recorder, self.rng.getstate()
+        self.is_simulation, self.recorder = True, None
+        player = self.players[self.players.index(player)]
+        record = self.make_move(player, self.get_opponent(player), action)
+        try:
+            return self.get_game_state(player)
+        finally:
+            self.unmake_move(record)
+            self.is_simulation, self.recorder = is_simulation, recorder
+            self.rng.setstate(rng_state)
                 
     def get_winner_and_terminated(self):
         """
@@ -571,3 +817,37 @@ class Game():
         Swaps the turn.
         """
         self.turn = self.players[(self.players.index(self.turn) + 1) % len(self.players)]
+
+def split_rng(rng, count):
+    """
+    Returns count random generators split from rng, so that parallel workers each draw from their own stream.
+
+    Each generator is seeded with 128 bits from rng, so the same rng always splits into the same generators.
+    """
+    return [random.Random(rng.getrandbits(128)) for i in range(count)]
+
+"""
+Action tables
+
+The playable actions of every phase, and the ones a player can afford in each coin bracket, are worked out once.
+The tables hold tuples, so they are shared by every game without being copied.
+"""
+def get_coin_bracket(coins):
+    """
+    Returns 0 if the coins can't pay for an assassination, 1 if they can't pay for a coup, and 2 otherwise.
+    """
+    return 0 if coins < 3 else 1 if coins < 7 else 2
+
+def get_affordable_actions(actions, bracket):
+    """
+    Returns a tuple of the actions that can be paid for in the coin bracket.
+    """
+    return tuple(action for action in actions if not (action == "assassinate" and bracket < 1 or action == "coup" and bracket < 2))
+
+# Playable actions after each action is played, keyed by the action, or None at the start of a turn
+PLAYABLE_ACTIONS = {None: TURN_ACTIONS, "block": ("allow", "challenge"), "challenge": TURN_ACTIONS}
+for action in TURN_ACTIONS:
+    PLAYABLE_ACTIONS[action] = ("allow",) + (("challenge",) if action in Game.challengeable_actions else ()) + (("block",) if action in Game.blockable_actions else ())
+
+# Legal actions, keyed by the playable actions and the coin bracket
+LEGAL_ACTIONS = {(actions, bracket): get_affordable_actions(actions, bracket) for actions in set(PLAYABLE_ACTIONS.values()) for bracket in range(3)}
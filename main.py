@@ -1,40 +1,28 @@
 import game
-import random
 import argparse
 import pprint
 import mcts
-
-from contextlib import contextmanager
-import sys, os
-# Code from: https://thesmithfam.org/blog/2012/10/25/temporarily-suppress-console-output-in-python/
-@contextmanager
-def suppress_stdout():
-    """
-    Suppresses stdout for the duration of the context. 
-    This is for copying the game state and playing out an action without printing to the console.
-    """
-    with open(os.devnull, "w") as devnull:
-        old_stdout = sys.stdout
-        sys.stdout = devnull
-        try:  
-            yield
-        finally:
-            sys.stdout = old_stdout
+import agents
+import openings
+import os
 
 parser = argparse.ArgumentParser()
 parser.add_argument("-p", "--player", help="Play against another player", action="store_true")
 parser.add_argument("-c", "--computer", help="Play against the computer", action="store_true")
+parser.add_argument("-w", "--workers", help="Number of processes the computer searches with", type=int, default=1)
+parser.add_argument("-j", "--threads", help="Number of threads each process of the computer searches one tree with", type=int, default=1)
+parser.add_argument("-t", "--time-limit", help="Milliseconds the computer can search for each decision", type=int, default=None)
+parser.add_argument("-b", "--book", help="Opening book the computer plays from, made with openings.py", default="openings.book")
 args = parser.parse_args()
 
-def game_loop_pvp():
+def game_loop_pvp(game):
     """
-    The game loop for player vs player.
+    The game loop for player vs player, played on game.
 
     This is largely for debugging purposes. It's not very fun to play.
     """
     while game.game_won == False:
         game.round += 1
-        random.shuffle(game.deck)
         print(f"==================== Round {game.round} ====================")
         for i in range(len(game.players)):
             influence_count = [len(player.hand) for player in game.players]
@@ -106,9 +94,9 @@ def game_loop_pvp():
                     print(f"An error occurred: {e}")
                     raise e
 
-def game_loop_pvc():
+def game_loop_pvc(game):
     """
-    The game loop for player vs computer.
+    The game loop for player vs computer, played on game.
     """
     
     def check_win(): 
@@ -128,63 +116,12 @@ def game_loop_pvc():
 
         However, there are some hardcoded strategies that the computer will prioritise before performing a search.
         """
-        if game.playable_actions == ["allow"]:
+        if game.playable_actions == ("allow",):
             return "allow"
         
         print("Computer is thinking...")
 
-        # Computer will coup if it has more than 7 coins.
-        if computer.coins >= 7:
-            return "coup"
-
-        # Last ditch efforts
-        if game.playable_actions == game.playable_actions == ["allow", "block", "challenge"]:
-            if game.current_action == "assassinate" and len(computer.hand) == 1:
-                if "contessa" in computer.hand:
-                    return "block"
-                return "challenge"
-
-        # Worst case scenario, computer doesn't have a hardcoded strategy so it will try to find the best move.
-        with suppress_stdout():
-            mcts_module = mcts.MCTS(game, args={'C':1.41, 'num_simulations':1000, 'max_depth':100})
-            mcts_probs = mcts_module.search()
-        # print(mcts_probs)
-        
-        action_prob = {game.playable_actions[i]: mcts_probs[i] for i in range(len(mcts_probs))}
-
-        if game.playable_actions == ["coup", "income", "foreign_aid", "tax", "steal", "assassinate", "exchange"]:
-
-            # Add more weighting to actions that are legal
-            if "duke" in computer.hand:
-                action_prob['tax'] += 0.1
-            if "captain" in computer.hand:
-                action_prob['steal'] += 0.1
-            if "assassin" in computer.hand:
-                action_prob['assassinate'] += 0.1
-            if "ambassador" in computer.hand:
-                action_prob['exchange'] += 0.1
-
-            # Remove more weighting to actions that are illegal
-            if "duke" not in computer.hand:
-                action_prob['tax'] -= 0.2
-            if "captain" not in computer.hand:
-                action_prob['steal'] -= 0.2
-            if "assassin" not in computer.hand:
-                action_prob['assassinate'] -= 0.2
-            if "ambassador" not in computer.hand:
-                action_prob['exchange'] -= 0.2
-
-            # Computer more likely to assassinate if it has more than 3 coins, and has the Assassin influence.
-            if computer.coins >= 3 and "assassin" in computer.hand:
-                action_prob['assassinate'] += 0.1
-
-            # Computer is more likely to steal if player is almost able to coup.
-            if player.coins >= 4:
-                if len(computer.hand) == 1:
-                    action_prob['steal'] += 0.9
-                action_prob['steal'] += 0.1
-        
-        return random.choices(list(action_prob.keys()), weights=list(action_prob.values()), k=1)[0]
+        return agents.get_computer_action(game, computer, computer_mcts, book)
     
     def print_game_status():
         print(f" {game.turn}'s turn ".center(80, "."))
@@ -196,9 +133,13 @@ def game_loop_pvc():
         
     player = game.players[game.players.index("Player")]
     computer = game.players[game.players.index("Computer")]    
+
+    # The search tree is kept between decisions and advanced with every action that is played.
+    # The computer searches without seeing the player's cards or the order of the deck.
+    book = openings.OpeningBook(args.book) if os.path.exists(args.book) else None
+    computer_mcts = mcts.MCTS(game, args={'C':1.41, 'num_simulations':1000, 'max_depth':100, 'num_workers':args.workers, 'num_threads':args.threads, 'time_limit':args.time_limit, 'determinize':True, 'search_cache':10000})
     while True:
         game.round += 1
-        random.shuffle(game.deck)
         print(f" Round {game.round} ".center(80, "="))
         print_game_status()
 
@@ -222,17 +163,20 @@ def game_loop_pvc():
         game.current_action = action
         print(f"Player chose {action}.")
         game.play_action(action=action)
+        computer_mcts.advance(action)
 
         # Ask computer to block/challenge
         response = get_computer_action()
         print(f"Computer chose to {response}.")
         game.play_action(player, computer, action=response)
+        computer_mcts.advance(response)
 
         # If computer blocks, ask player to challenge or allow
         if game.block_attempted:
             print(f"Player, choose to challenge or allow: ")
             response = input().lower().replace(" ", "_")
             game.play_action(player, computer, action=response)
+            computer_mcts.advance(response)
 
         if check_win():
             break
@@ -247,18 +191,21 @@ def game_loop_pvc():
         print(f"Computer chose {action}.")
         game.current_action = action
         game.play_action(action=action)
+        computer_mcts.advance(action)
                     
         # Ask player to block/challenge
         print(f"Player, choose to {', '.join(game.playable_actions)}: ")
         response = input().lower().replace(" ", "_")
         print(f"Player chose {response}.")
         game.play_action(computer, player, action=response)
+        computer_mcts.advance(response)
 
         # If player blocks, ask computer to challenge or allow
         if game.block_attempted:
             response = get_computer_action()
             print(f"Computer chose to {response}.")
             game.play_action(computer, player, action=response)
+            computer_mcts.advance(response)
         
         if check_win():
             break
@@ -266,17 +213,17 @@ def game_loop_pvc():
 
 
 if __name__ == "__main__":
-    game = game.Game()
+    coup = game.Game()
 
     print("Welcome to Coup!")
 
     if args.player:
         print("Player vs Player")
-        game.initial_draw()
-        game_loop_pvp()
+        coup.initial_draw()
+        game_loop_pvp(coup)
     else:
         print("Player vs Computer")
-        game.initial_draw_computer()
-        game_loop_pvc()
+        coup.initial_draw_computer()
+        game_loop_pvc(coup)
 
     exit = input("Press Enter to exit.")
\ No newline at end of file
@@ -1,114 +1,540 @@
-from copy import copy, deepcopy
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import atexit
 import math
+import multiprocessing
+import os
+import pickle
 import random
+import sys
+import threading
+import time
 import game
+import policies
+from game import ACTIONS, ACTION_INDEX
 
-class Node:
+try:
+    import rollouts
+except ImportError: # NumPy is not installed
+    rollouts = None
+
+# Virtual loss of tree-parallel searches, about the sum of the rewards of a rollout of 100 steps that is won early
+VIRTUAL_LOSS = 100000
+
+class TranspositionTable:
+    """
+    Statistics slots of the positions in the search, keyed by Game.get_state_key().
+
+    The table holds at most max_size positions, evicting the least recently used.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        """
+        Returns the statistics slot of a position, or None if the position is not in the table.
+        """
+        slot = self.entries.get(key)
+        if slot is not None:
+            self.entries.move_to_end(key)
+        return slot
+
+    def put(self, key, slot):
+        """
+        Adds the statistics slot of a position, evicting the least recently used position if the table is full.
+        """
+        self.entries[key] = slot
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+class SearchCache(TranspositionTable):
     """
-    Node class for the Monte Carlo Tree Search Tree
+    Results of earlier searches, keyed by MCTS.get_cache_key(), which are shared by every search in the process.
+
+    A result is the visits and value sum of each of the root's children, as a dictionary of actions to (visits, value_sum).
+    If path is given, the cache is loaded from the file if it exists, and save() writes it back.
+
+    Searches in different threads, such as the server's, use the cache at the same time, so it is only read and
+    changed while holding its lock.
+    """
+    def __init__(self, max_size, path=None):
+        super().__init__(max_size)
+        self.path = path
+        self.lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as file:
+                for key, statistics in pickle.load(file):
+                    self.put(key, statistics)
+
+    def get(self, key):
+        with self.lock:
+            return super().get(key)
+
+    def put(self, key, statistics):
+        with self.lock:
+            super().put(key, statistics)
+
+    def save(self):
+        """
+        Writes the cache to its file, if it has one.
+        """
+        if self.path is not None:
+            with self.lock:
+                entries = list(self.entries.items())
+            with open(self.path, "wb") as file:
+                pickle.dump(entries, file)
+
+class SearchStats:
+    """
+    Statistics about where a search spent its time, collected when args['stats'] is True or args['stats_callback'] is given.
+    The statistics of the last search are stored in MCTS.stats, and are passed to args['stats_callback'].
+
+    Times are in seconds. Clones are the copies of the root's game that each simulation is played on.
     """
-    def __init__(self, game: game, args, parent=None, action=None):
+    def __init__(self):
+        self.simulations = 0
+        self.total_time = 0
+        self.selection_time = 0
+        self.expansion_time = 0
+        self.simulation_time = 0
+        self.backpropagation_time = 0
+        self.nodes_allocated = 0
+        self.max_tree_depth = 0
+        self.rollouts = 0
+        self.rollout_steps = 0
+        self.max_depth = 0
+        self.clones = 0
+        self.clone_bytes = 0
+
+    @property
+    def rollouts_per_second(self):
+        return self.rollouts / self.simulation_time if self.simulation_time else 0
+
+    @property
+    def average_rollout_length(self):
+        return self.rollout_steps / self.rollouts if self.rollouts else 0
+
+    @property
+    def rollout_length_ratio(self):
+        """Average rollout length as a fraction of args['max_depth']."""
+        return self.average_rollout_length / self.max_depth if self.max_depth else 0
+
+    def merge(self, other):
+        """
+        Add the statistics of another search, such as that of another worker.
+        """
+        for name, value in vars(other).items():
+            if name.startswith("max_"):
+                setattr(self, name, max(getattr(self, name), value))
+            else:
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        """
+        Returns the statistics as a dictionary, including the rates.
+        """
+        stats = dict(vars(self))
+        stats["rollouts_per_second"] = self.rollouts_per_second
+        stats["average_rollout_length"] = self.average_rollout_length
+        stats["rollout_length_ratio"] = self.rollout_length_ratio
+        return stats
+
+def clone_size(game):
+    """
+    Returns the number of bytes allocated by Game.clone(). Strings are shared with the original, so they aren't counted.
+    """
+    size = sys.getsizeof(game) + sys.getsizeof(game.players) + sys.getsizeof(game.deck) + sys.getsizeof(game.deck.counts) + sys.getsizeof(game.playable_actions)
+    for player in game.players:
+        size += sys.getsizeof(player) + sys.getsizeof(player.hand)
+    return size
+
+def determinizations(game, observer):
+    """
+    Yields copies of the game where the cards that the player at index observer can't see are dealt at random.
+
+    The other players keep the number of cards they hold, and the rest of the unseen cards make up the deck.
+    Each copy is made when it is asked for, so a search only copies the game once per simulation.
+    """
+    unseen = game.deck.clone()
+    for index, player in enumerate(game.players):
+        if index != observer:
+            for card in player.hand:
+                unseen.append(card)
+    while True:
+        determinization = game.clone()
+        deck = unseen.clone()
+        for index, player in enumerate(determinization.players):
+            if index != observer:
+                player.hand = [deck.draw(game.rng) for card in player.hand]
+        determinization.deck = deck
+        yield determinization
+
+class Tree:
+    """
+    Monte Carlo Tree Search Tree, stored as typed arrays with an entry for each node instead of an object for each node.
+
+    The root is node 0, and only the root's game is stored. The other nodes only store the action that reaches them,
+    and the game of a node is played out from the root's game as the search walks down to it.
+
+    The children of a node are stored next to each other from first_child, and are all allocated, in a random order,
+    the first time the node is expanded. They are then expanded one at a time, so the first num_expanded children
+    have been expanded and the rest are the untried actions.
+
+    Visits and value sums are stored per statistics slot. Each node has its own slot, unless a transposition table is
+    used, in which case nodes in the same position share one.
+
+    A tree can be searched by many threads at once with select_leaf_shared and backpropagate_shared, which only touch
+    the arrays while holding the tree's lock. The rollouts, which are most of the work, are played without it.
+    """
+    def __init__(self, game, args, table=None):
         self.game = game
         self.args = args
-        self.state = self.game.get_game_state(game.turn)
-        self.parent = parent
-        self.action = action
+        self.table = table
+        self.rollout_policy = policies.get_rollout_policy(args.get('rollout_policy'))
 
-        self.children = []
-        self.untried_actions = copy(self.game.playable_actions)
+        # Nodes
+        self.parent = array('q')
+        self.action = array('b')
+        self.first_child = array('q')
+        self.num_children = array('b')
+        self.num_expanded = array('b')
+        self.slot = array('q')
 
-        # Remove actions that can't be played
-        if "coup" in self.untried_actions or "assassinate" in self.untried_actions:
-            if self.state['coins'] < 3:
-                self.untried_actions.remove('assassinate')
-            if self.state['coins'] < 7:
-                self.untried_actions.remove('coup')
+        # Statistics slots
+        self.visits = array('q')
+        self.value_sum = array('d')
+        self.pending = array('q') # Simulations running through the slot, with a virtual loss
 
-        self.visits = 0
-        self.value_sum = 0
+        self.lock = threading.Lock()
 
-    def is_fully_expanded(self):
+        if game is not None:
+            self.add_node(-1, -1)
+            self.assign_slot(0, game)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add_node(self, parent, action):
+        """
+        Adds a node that hasn't been expanded, and returns its index.
+        """
+        self.parent.append(parent)
+        self.action.append(action)
+        self.first_child.append(-1)
+        self.num_children.append(0)
+        self.num_expanded.append(0)
+        self.slot.append(-1)
+        return len(self.parent) - 1
+
+    def add_slot(self, visits=0, value_sum=0):
+        """
+        Adds a statistics slot, and returns its index.
+        """
+        self.visits.append(visits)
+        self.value_sum.append(value_sum)
+        self.pending.append(0)
+        return len(self.visits) - 1
+
+    def assign_slot(self, node, game):
+        """
+        Gives a node that has just been expanded, with the given game, the statistics slot of its position.
+        """
+        if self.table is None:
+            self.slot[node] = self.add_slot()
+            return
+        key = game.get_state_key()
+        slot = self.table.get(key)
+        if slot is None:
+            slot = self.add_slot()
+            self.table.put(key, slot)
+        self.slot[node] = slot
+
+    def get_visits(self, node):
+        """
+        Returns the visits of a node, which is 0 for a node that hasn't been expanded.
+        """
+        slot = self.slot[node]
+        return self.visits[slot] if slot >= 0 else 0
+
+    def get_children(self, node):
+        """
+        Returns the indices of the children of a node that have been expanded.
+        """
+        first = self.first_child[node]
+        return range(first, first + self.num_expanded[node]) if first >= 0 else range(0)
+
+    def is_fully_expanded(self, node):
         """
         Check if the node has been fully expanded
         """
-        return len(self.untried_actions) == 0 and len(self.children) > 0
-    
-    def select(self):
+        return self.num_children[node] > 0 and self.num_expanded[node] == self.num_children[node]
+
+    def select(self, node):
         """
         Select the child with the highest UCB score
         """
-        best_child = None
+        best_child = -1
         best_score = -999999999999999999999
 
-        for child in self.children:
-            score = self.get_ucb(child)
+        visits = self.visits
+        value_sum = self.value_sum
+        C = self.args['C']
+        log_visits = math.log(visits[self.slot[node]])
+        first = self.first_child[node]
+        for child in range(first, first + self.num_children[node]):
+            slot = self.slot[child]
+            q_value = 1 - ((value_sum[slot] / visits[slot]) + 1) / 2
+            score = q_value + C * math.sqrt(log_visits / visits[slot])
             if score > best_score:
                 best_child = child
                 best_score = score
 
         return best_child
 
-    
-    def get_ucb(self, child):
+    def get_game(self, node):
         """
-        Calculate the UCB score for a child node
+        Returns a copy of the root's game with the actions from the root to the node played.
         """
-        q_value = 1 - ((child.value_sum / child.visits) + 1) / 2
-        return q_value + self.args['C'] * math.sqrt(math.log(self.visits) / child.visits)
+        path = []
+        while node > 0:
+            path.append(node)
+            node = self.parent[node]
+        game = self.game.clone()
+        for node in reversed(path):
+            self.play(game, node)
+        return game
 
-    def expand(self):
-        action = random.choice(self.untried_actions)
-        self.untried_actions.remove(action)
+    def play(self, game, node):
+        """
+        Plays the action that reaches the node on the game of its parent, with Game.apply.
+        """
+        game.apply(ACTIONS[self.action[node]])
 
-        child_state = self.game.get_next_state(self.state["turn"], action)
+    def expand(self, node, game):
+        """
+        Expands an untried action of the node, playing it on the node's game, and returns the child.
+        A node without any actions is returned itself.
+        """
+        if self.first_child[node] < 0:
+            actions = game.get_legal_actions(game.turn)
+            self.first_child[node] = len(self.parent)
+            self.num_children[node] = len(actions)
+            for action in game.rng.sample(actions, len(actions)):
+                self.add_node(node, ACTION_INDEX[action])
+        if self.num_expanded[node] == self.num_children[node]:
+            return node
 
-        child = Node(self.game, self.args, self, action)
-        self.children.append(child)
+        child = self.first_child[node] + self.num_expanded[node]
+        self.num_expanded[node] += 1
+        self.play(game, child)
+        self.assign_slot(child, game)
         return child
 
-    def simulate(self):
-        winner, terminated = self.game.get_winner_and_terminated()
-        if winner != "":
-            winner = self.game.players[(self.game.players.index(winner) + 1) % len(self.game.players)]
+    def simulate(self, node, game):
+        """
+        Adds the reward of a rollout from the node to its value, and returns the value. The rollout is played on the game itself.
 
+        The rollout is played with the rollout policy, or as uniform NumPy rollouts if args['rollout_batch'] is given.
+        """
+        slot = self.slot[node]
+        winner, terminated = game.get_winner_and_terminated()
         if terminated:
-            return winner
-        
-        rollout_game = deepcopy(self.game)
-        rollout_player = self.game.turn
-        rollout_opponent = self.game.players[(self.game.players.index(rollout_player) + 1) % len(self.game.players)]
-        for i in range(self.args['max_depth']):
-            action = random.choice(rollout_game.playable_actions)
-            rollout_game.play_action(rollout_player, rollout_opponent, action)
-            winner, terminated = rollout_game.get_winner_and_terminated()
-            # Rewards
-            self.value_sum += rollout_player.coins
-            if len(rollout_opponent.hand) == 1:
-                self.value_sum += 300
-            if len(rollout_opponent.hand) == 0:
-                self.value_sum += 900
-
-            # Punishments
-            if rollout_opponent.coins >=7:
-                self.value_sum -= 100
-            else:
-                self.value_sum -= rollout_opponent.coins
-            if len(rollout_player.hand) == 1:
-                self.value_sum -= 100
-            if len(rollout_player.hand) == 0:
-                self.value_sum -= 300
-
-            rollout_player = self.game.players[(self.game.players.index(rollout_player) + 1) % len(self.game.players)]
-        return self.value_sum
-    def backpropagate(self, value_sum):
-        self.visits += 1
-        if self.state['winner'] == "Player":
-            self.value_sum = -value_sum
-        self.value_sum += value_sum
-
-        if self.parent is not None:
-            self.parent.backpropagate(value_sum)
-    
+            return self.value_sum[slot]
+        return self.add_reward(node, self.rollout(game))
+
+    def rollout(self, game, rollout_policy=None):
+        """
+        Returns the reward of a rollout played on the game itself, with rollout_policy or the tree's rollout policy.
+        """
+        if self.args.get('rollout_batch'):
+            # Play the rollouts together with NumPy and use their mean reward
+            if rollouts is None:
+                raise ImportError("NumPy is required for args['rollout_batch']")
+            return rollouts.simulate(game, self.args['rollout_batch'], self.args['max_depth'])
+        return (rollout_policy or self.rollout_policy).play(game, self.args['max_depth'])
+
+    def add_reward(self, node, reward):
+        """
+        Adds the reward of a rollout from the node to its value, and returns the value.
+        """
+        slot = self.slot[node]
+        self.value_sum[slot] += reward
+        return self.value_sum[slot]
+
+    def select_leaf(self, game):
+        """
+        Walks down from the root, playing the actions on the root's game, until an untried action is expanded or a
+        terminal node is reached. Returns the node, and whether it is terminal.
+        """
+        node = 0
+        while self.is_fully_expanded(node):
+            node = self.select(node)
+            self.play(game, node)
+        winner, terminated = game.get_winner_and_terminated()
+        if not terminated:
+            node = self.expand(node, game)
+        return node, terminated
+
+    def select_leaf_shared(self, game, virtual_loss):
+        """
+        select_leaf for a tree that other threads are searching at the same time.
+
+        A virtual loss is added to the node and each of its ancestors until the simulation is passed to
+        backpropagate_shared: they get a visit, and virtual_loss is added to their value, so the other threads are
+        steered to other nodes while the rollout is played.
+        """
+        with self.lock:
+            node, terminated = self.select_leaf(game)
+            self.add_virtual_loss(node, 1, virtual_loss)
+        return node, terminated
+
+    def backpropagate_shared(self, node, reward, virtual_loss):
+        """
+        Removes the virtual loss added by select_leaf_shared, then adds the reward of the rollout, or None if the node
+        is terminal, to the node and backpropagates it like simulate and backpropagate.
+        """
+        with self.lock:
+            self.add_virtual_loss(node, -1, -virtual_loss)
+            slot = self.slot[node]
+            if reward is not None:
+                self.value_sum[slot] += reward
+            # Other threads may still have a virtual loss on the node's slot, which isn't part of its value
+            self.backpropagate(node, self.value_sum[slot] - self.pending[slot] * virtual_loss)
+
+    def add_virtual_loss(self, node, visits, value_sum):
+        """
+        Adds visits and value_sum to the node and each of its ancestors as a virtual loss, or removes it if they are negative.
+        """
+        slots = self.slot
+        parents = self.parent
+        while node >= 0:
+            slot = slots[node]
+            self.visits[slot] += visits
+            self.value_sum[slot] += value_sum
+            self.pending[slot] += visits
+            node = parents[node]
+
+    def add_priors(self, statistics):
+        """
+        Expands every child of the root with the visits and value sums of an earlier search, given as a dictionary of actions to (visits, value_sum).
+
+        Nothing is added unless every legal action of the root was visited by the earlier search.
+        """
+        actions = self.game.get_legal_actions(self.game.turn)
+        if self.first_child[0] >= 0 or not actions or any(statistics.get(action, (0, 0))[0] == 0 for action in actions):
+            return
+        self.first_child[0] = len(self.parent)
+        self.num_children[0] = len(actions)
+        self.num_expanded[0] = len(actions)
+        for action in actions:
+            child = self.add_node(0, ACTION_INDEX[action])
+            child_game = self.game.clone()
+            self.play(child_game, child)
+            self.assign_slot(child, child_game)
+            visits, value_sum = statistics[action]
+            self.visits[self.slot[child]] += visits
+            self.value_sum[self.slot[child]] += value_sum
+            self.visits[self.slot[0]] += visits
+            self.value_sum[self.slot[0]] += value_sum
+
+    def backpropagate(self, node, value_sum):
+        """
+        Adds a visit and the value to the node and each of its ancestors.
+        """
+        visits = self.visits
+        values = self.value_sum
+        slots = self.slot
+        parents = self.parent
+        while node >= 0:
+            slot = slots[node]
+            visits[slot] += 1
+            values[slot] += value_sum
+            node = parents[node]
+
+    def subtree(self, node):
+        """
+        Returns a new tree holding the node, as the root, and its descendants. The transposition table is updated to the new slots.
+        """
+        tree = Tree(None, self.args, self.table)
+        tree.game = self.get_game(node)
+        slots = {}
+
+        def copy_node(node, parent):
+            copy = tree.add_node(parent, self.action[node])
+            slot = self.slot[node]
+            if slot >= 0:
+                if slot not in slots:
+                    slots[slot] = tree.add_slot(self.visits[slot], self.value_sum[slot])
+                tree.slot[copy] = slots[slot]
+            return copy
+
+        tree.action[copy_node(node, -1)] = -1
+        queue = deque([(node, 0)])
+        while queue:
+            node, copy = queue.popleft()
+            first = self.first_child[node]
+            if first < 0:
+                continue
+            tree.first_child[copy] = len(tree)
+            tree.num_children[copy] = self.num_children[node]
+            tree.num_expanded[copy] = self.num_expanded[node]
+            for child in range(first, first + self.num_children[node]):
+                queue.append((child, copy_node(child, copy)))
+
+        if self.table is not None:
+            self.table.entries = OrderedDict((key, slots[slot]) for key, slot in self.table.entries.items() if slot in slots)
+        return tree
+
+class Node:
+    """
+    A node of a Tree. Nodes are views of the tree's arrays, created when they are needed.
+
+    The game of a node is played out from the root each time it is read.
+    """
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def game(self):
+        return self.tree.get_game(self.index)
+
+    @property
+    def action(self):
+        action = self.tree.action[self.index]
+        return ACTIONS[action] if action >= 0 else None
+
+    @property
+    def visits(self):
+        return self.tree.get_visits(self.index)
+
+    @property
+    def value_sum(self):
+        slot = self.tree.slot[self.index]
+        return self.tree.value_sum[slot] if slot >= 0 else 0
+
+    @property
+    def parent(self):
+        parent = self.tree.parent[self.index]
+        return Node(self.tree, parent) if parent >= 0 else None
+
+    @property
+    def children(self):
+        return [Node(self.tree, child) for child in self.tree.get_children(self.index)]
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
 class MCTS:
     """
     Monte Carlo Tree Search Algorithm
@@ -117,40 +543,421 @@ class MCTS:
     https://github.com/foersterrobert/AlphaZeroFromScratch/blob/main/2.MCTS.ipynb 
     """
     def __init__(self, game, args):
+        """
+        Initialize the search of the game with args.
+
+        Raises ValueError if neither args['num_simulations'] nor args['time_limit'] is given, as the search would never stop,
+        or if SearchStats are asked for from a search with args['num_threads'] threads, which doesn't collect them.
+        """
+        if args.get('num_simulations') is None and args.get('time_limit') is None:
+            raise ValueError("A search needs args['num_simulations'] or args['time_limit']")
+        if args.get('num_threads', 1) > 1 and (args.get('stats') or args.get('stats_callback')):
+            raise ValueError("SearchStats aren't collected by searches with more than one thread")
         self.game = game
         self.args = args
+        self.tree = None
+        self.simulations_run = 0
+        self.table = None
+        self.stats = None
+        self.statistics = {}
+        # Without a seed, the search is seeded from the state of the game's generator rather than drawing from it, so
+        # that starting a search doesn't change the cards the game deals later
+        self.rng = random.Random(args['seed'] if args.get('seed') is not None else hash(game.rng.getstate()))
+
+    @property
+    def root(self):
+        """
+        The root node of the tree kept from the last search, or None.
+        """
+        return Node(self.tree, 0) if self.tree is not None else None
 
     def search(self):
-        game_simulation = deepcopy(self.game)
-        game_simulation.is_simulation = True
-        root = Node(game_simulation, self.args)
-
-        for simulation in range(self.args['num_simulations']):
-            node = root
-            # Selection
-            while node.is_fully_expanded():
-                node = node.select()
-            winner, terminated = game_simulation.get_winner_and_terminated()
-            if winner != '':
-                winner = game_simulation.players[(game_simulation.players.index(winner) + 1) % len(game_simulation.players)]
-            if not terminated:
-                # Expansion
-                node = node.expand()
-                # Simulation
-                value_sum = node.simulate()
+        """
+        Returns the probability of playing each of the game's playable actions, based on the visits of the root's children.
+
+        The search stops after args['num_simulations'] simulations or, if args['time_limit'] is given, after that many milliseconds,
+        whichever comes first. The number of simulations that were run is stored in simulations_run.
+
+        If args['num_workers'] is more than 1, the simulations are split across a pool of worker processes. If
+        args['num_threads'] is more than 1, the simulations of each process are run by that many threads on one tree.
+
+        If args['search_cache'] is given, the result is stored in the process's search cache of that size (saved to
+        args['search_cache_path'] if given), and a search of a position in the cache starts from the cached result.
+        If the cached result has at least args['num_simulations'] visits, and its most visited action has at least
+        args['search_cache_confidence'] of them, it is returned without searching.
+        """
+        priors = self.get_cached_statistics()
+        if priors is not None and self.is_confident(priors):
+            return self.use_statistics(priors)
+
+        if self.args.get('num_workers', 1) > 1:
+            visits = self.search_parallel(priors)
+        elif self.args.get('num_threads', 1) > 1:
+            visits = self.search_threaded(priors)
+        else:
+            visits = self.get_root_visits(priors)
+        self.cache_statistics()
+        return self.get_action_probs(visits)
+
+    def get_cached_statistics(self):
+        """
+        Returns the result of an earlier search of the game from the search cache, or None if it isn't cached or
+        args['search_cache'] isn't given.
+        """
+        if not self.args.get('search_cache'):
+            return None
+        return get_search_cache(self.args['search_cache'], self.args.get('search_cache_path')).get(self.get_cache_key())
+
+    def use_statistics(self, statistics):
+        """
+        Returns the probabilities of a cached result that is used without searching, and stores it in statistics.
+        """
+        self.simulations_run = 0
+        self.stats = None
+        self.statistics = statistics
+        return self.get_action_probs({action: visits for action, (visits, value_sum) in statistics.items()})
+
+    def cache_statistics(self):
+        """
+        Stores the result of the search in the search cache, if args['search_cache'] is given.
+        """
+        if self.args.get('search_cache'):
+            get_search_cache(self.args['search_cache'], self.args.get('search_cache_path')).put(self.get_cache_key(), self.statistics)
+
+    def get_cache_key(self):
+        """
+        Returns the key of the game in the search cache, which only includes what the searching player can see if args['determinize'] is True.
+        """
+        if self.args.get('determinize'):
+            return self.game.get_information_key(self.game.players.index(self.game.turn))
+        return self.game.get_state_key()
+
+    def is_confident(self, statistics):
+        """
+        Check if a cached result is enough to return without searching.
+        """
+        confidence = self.args.get('search_cache_confidence')
+        total_visits = sum(visits for visits, value_sum in statistics.values())
+        if confidence is None or total_visits == 0 or total_visits < (self.args.get('num_simulations') or 0):
+            return False
+        return max(visits for visits, value_sum in statistics.values()) >= confidence * total_visits
+
+    def get_action_probs(self, visits):
+        """
+        Returns the probability of playing each of the game's playable actions from the visits of each action.
+        """
+        total_visits = sum(visits.values()) or 1
+        action_probs = [0] * len(self.game.playable_actions)
+        for action, count in visits.items():
+            action_probs[self.game.playable_actions.index(action)] = count
+        if 'coup' in self.game.playable_actions:
+            action_probs[self.game.playable_actions.index('coup')] = 0
+        if 'assassinate' in self.game.playable_actions:
+            action_probs[self.game.playable_actions.index('assassinate')] = 0
 
-            # Backpropagation
-            node.backpropagate(value_sum)
-
-        # return visits
-        action_probs = game_simulation.playable_actions
-        for child in root.children:
-            action_probs[action_probs.index(child.action)] = child.visits
-        if 'coup' in action_probs:
-            action_probs[action_probs.index('coup')] = 0
-        if 'assassinate' in action_probs:
-            action_probs[action_probs.index('assassinate')] = 0
-        
         for i in range(len(action_probs)):
-            action_probs[i] /= self.args['num_simulations']
-        return(action_probs)
\ No newline at end of file
+            action_probs[i] /= total_visits
+        return action_probs
+
+    def get_root_visits(self, priors=None):
+        """
+        Runs the simulations in this process and returns a dictionary of the visits of each of the root's children.
+        Their visits and value sums are stored in statistics.
+
+        The tree is kept after the search. If advance() has moved the root to a node in the same position as the game, the search continues from it.
+        Otherwise a new tree is started, from priors if they are given (see Tree.add_priors).
+
+        If args['determinize'] is True, the search can't see the cards of the other players or the order of the deck.
+        Each simulation is played on a determinization, where the cards the player can't see are dealt at random, and
+        all the determinizations share the one tree. Positions are then compared by what the player can see.
+        """
+        tree, simulation_games, new_tree = self.prepare_tree(priors)
+
+        num_simulations = self.args.get('num_simulations')
+        deadline = None
+        if self.args.get('time_limit') is not None:
+            deadline = time.perf_counter() + self.args['time_limit'] / 1000
+
+        self.stats = None
+        if self.args.get('stats') or self.args.get('stats_callback'):
+            self.stats = SearchStats()
+            self.stats.nodes_allocated = int(new_tree)
+            self.stats.max_depth = self.args['max_depth']
+            start = time.perf_counter()
+
+        self.simulations_run = 0
+        while num_simulations is None or self.simulations_run < num_simulations:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            self.simulations_run += 1
+            if self.stats is not None:
+                self.simulate_with_stats(tree, next(simulation_games), self.stats)
+                continue
+            game_simulation = next(simulation_games)
+            # Selection and expansion
+            node, terminated = tree.select_leaf(game_simulation)
+            # Simulation
+            value_sum = tree.simulate(node, game_simulation)
+
+            # Backpropagation
+            tree.backpropagate(node, value_sum)
+
+        if self.stats is not None:
+            self.stats.simulations = self.simulations_run
+            self.stats.total_time = time.perf_counter() - start
+            if self.args.get('stats_callback'):
+                self.args['stats_callback'](self.stats)
+
+        return self.get_root_statistics()
+
+    def prepare_tree(self, priors=None):
+        """
+        Returns the tree to search the game with, an iterator of the games to play each simulation on, and whether the tree is new.
+        """
+        game_simulation = self.game.clone()
+        game_simulation.is_simulation = True
+        game_simulation.output = None
+        game_simulation.rng = self.rng
+        if self.args.get('determinize'):
+            observer = self.game.players.index(self.game.turn)
+            new_tree = self.tree is None or self.tree.game.get_information_key(observer) != self.game.get_information_key(observer)
+        else:
+            new_tree = self.tree is None or self.tree.game.get_state_key() != self.game.get_state_key()
+        if new_tree:
+            if self.args.get('transposition_table'):
+                self.table = TranspositionTable(self.args['transposition_table'])
+            self.tree = Tree(game_simulation, self.args, self.table)
+            if priors is not None:
+                self.tree.add_priors(priors)
+        else:
+            self.tree.game = game_simulation
+        tree = self.tree
+
+        return tree, self.get_simulation_games(tree.game), new_tree
+
+    def get_simulation_games(self, root):
+        """
+        Returns an iterator of the games to play each simulation on, which are copies or determinizations of root.
+        """
+        if self.args.get('determinize'):
+            return determinizations(root, self.game.players.index(self.game.turn))
+        return iter(root.clone, None)
+
+    def search_threaded(self, priors=None):
+        """
+        Tree parallelisation. args['num_threads'] threads run the simulations on the one tree, like get_root_visits,
+        and return a dictionary of the visits of each of the root's children.
+
+        While a thread plays a rollout, the nodes it walked through have a virtual loss of args['virtual_loss'] (see
+        Tree.select_leaf_shared). The threads run at the same time on a free-threaded build of Python, and otherwise
+        only while the NumPy rollouts release the GIL. Each thread draws from its own generator split from rng, but the
+        result also depends on the order the threads run in, so it isn't repeatable. SearchStats aren't collected, so MCTS
+        rejects args asking for them.
+        """
+        tree, simulation_games, new_tree = self.prepare_tree(priors)
+        virtual_loss = self.args.get('virtual_loss', VIRTUAL_LOSS)
+        num_simulations = self.args.get('num_simulations')
+        deadline = None
+        if self.args.get('time_limit') is not None:
+            deadline = time.perf_counter() + self.args['time_limit'] / 1000
+
+        self.stats = None
+        self.simulations_run = 0
+        lock = threading.Lock()
+
+        def run(rng):
+            root = tree.game.clone()
+            root.rng = rng
+            simulation_games = self.get_simulation_games(root)
+            rollout_policy = policies.get_rollout_policy(self.args.get('rollout_policy'))
+            while deadline is None or time.perf_counter() < deadline:
+                with lock:
+                    if num_simulations is not None and self.simulations_run >= num_simulations:
+                        return
+                    self.simulations_run += 1
+                game_simulation = next(simulation_games)
+                node, terminated = tree.select_leaf_shared(game_simulation, virtual_loss)
+                winner, terminated = game_simulation.get_winner_and_terminated()
+                reward = tree.rollout(game_simulation, rollout_policy) if not terminated else None
+                tree.backpropagate_shared(node, reward, virtual_loss)
+
+        with ThreadPoolExecutor(self.args['num_threads']) as executor:
+            for future in [executor.submit(run, rng) for rng in game.split_rng(self.rng, self.args['num_threads'])]:
+                future.result()
+        return self.get_root_statistics()
+
+    def get_root_statistics(self):
+        """
+        Stores the visits and value sums of the root's children in statistics, and returns a dictionary of their visits.
+        """
+        tree = self.tree
+        self.statistics = {ACTIONS[tree.action[child]]: (tree.get_visits(child), tree.value_sum[tree.slot[child]]) for child in tree.get_children(0)}
+        return {action: visits for action, (visits, value_sum) in self.statistics.items()}
+
+    def simulate_with_stats(self, tree, game_simulation, stats):
+        """
+        Runs one simulation from the root like get_root_visits, timing each step and counting the work done.
+        """
+        # Selection
+        start = time.perf_counter()
+        node = 0
+        depth = 0
+        stats.clones += 1
+        stats.clone_bytes += clone_size(game_simulation)
+        while tree.is_fully_expanded(node):
+            node = tree.select(node)
+            tree.play(game_simulation, node)
+            depth += 1
+        winner, terminated = game_simulation.get_winner_and_terminated()
+        selected = time.perf_counter()
+        stats.selection_time += selected - start
+
+        # Expansion
+        if not terminated:
+            num_nodes = len(tree)
+            node = tree.expand(node, game_simulation)
+            depth += 1
+            stats.nodes_allocated += len(tree) - num_nodes
+        stats.max_tree_depth = max(stats.max_tree_depth, depth)
+        expanded = time.perf_counter()
+        stats.expansion_time += expanded - selected
+
+        # Simulation
+        steps = tree.rollout_policy.steps
+        value_sum = tree.simulate(node, game_simulation)
+        if not terminated:
+            rollouts_played = self.args.get('rollout_batch') or 1
+            stats.rollouts += rollouts_played
+            if self.args.get('rollout_batch'):
+                stats.rollout_steps += rollouts_played * self.args['max_depth']
+            else:
+                stats.rollout_steps += tree.rollout_policy.steps - steps
+        simulated = time.perf_counter()
+        stats.simulation_time += simulated - expanded
+
+        # Backpropagation
+        tree.backpropagate(node, value_sum)
+        stats.backpropagation_time += time.perf_counter() - simulated
+
+    def advance(self, action):
+        """
+        Moves the root of the tree to the child reached by playing action, discarding the rest of the tree.
+        """
+        if self.tree is None:
+            return
+        for child in self.tree.get_children(0):
+            if ACTIONS[self.tree.action[child]] == action:
+                self.tree = self.tree.subtree(child)
+                return
+        self.tree = None
+
+    def search_parallel(self, priors=None):
+        """
+        Root parallelisation. Each worker searches its own tree with its own seed, and the statistics of the roots are summed.
+        """
+        start = time.perf_counter()
+        num_workers = self.args['num_workers']
+        pool = get_pool(num_workers)
+        game_simulation = self.game.clone()
+        game_simulation.output = None
+        jobs = []
+        rngs = game.split_rng(self.rng, num_workers)
+        for worker in range(num_workers):
+            worker_args = dict(self.args, num_workers=1, stats_callback=None, stats=bool(self.args.get('stats') or self.args.get('stats_callback')))
+            if self.args.get('num_simulations') is not None:
+                simulations, remainder = divmod(self.args['num_simulations'], num_workers)
+                worker_args['num_simulations'] = simulations + (worker < remainder)
+            if self.args.get('time_limit') is not None:
+                # Time spent starting the pool and copying the game counts towards the limit
+                worker_args['time_limit'] = self.args['time_limit'] - (time.perf_counter() - start) * 1000
+            # The priors are only given to one worker, so that they are only counted once in the sum
+            jobs.append((game_simulation, worker_args, rngs[worker], priors if worker == 0 else None))
+
+        self.statistics = {}
+        self.simulations_run = 0
+        self.stats = None
+        for worker_statistics, simulations_run, stats in pool.starmap(_search_worker, jobs):
+            self.simulations_run += simulations_run
+            for action, (visits, value_sum) in worker_statistics.items():
+                total_visits, total_value_sum = self.statistics.get(action, (0, 0))
+                self.statistics[action] = (total_visits + visits, total_value_sum + value_sum)
+            if stats is not None:
+                if self.stats is None:
+                    self.stats = SearchStats()
+                self.stats.merge(stats)
+        if self.stats is not None and self.args.get('stats_callback'):
+            self.args['stats_callback'](self.stats)
+        return {action: visits for action, (visits, value_sum) in self.statistics.items()}
+
+def _search_worker(game, args, rng, priors):
+    """
+    Search run by each worker process of a parallel search.
+    """
+    search = MCTS(game, args)
+    search.rng = rng
+    if args.get('num_threads', 1) > 1:
+        search.search_threaded(priors)
+    else:
+        search.get_root_visits(priors)
+    return search.statistics, search.simulations_run, search.stats
+
+"""
+Worker pool
+
+The pool is kept between searches so that the worker processes are only started once.
+"""
+_pool = None
+_pool_size = 0
+
+def get_pool(num_workers):
+    """
+    Returns the pool of worker processes, starting it if it has not been started or has the wrong number of workers.
+    """
+    global _pool, _pool_size
+    if _pool is None or _pool_size != num_workers:
+        close_pool()
+        _pool = multiprocessing.Pool(num_workers)
+        _pool_size = num_workers
+    return _pool
+
+def close_pool():
+    """
+    Stops the worker processes of the pool, if it has been started.
+    """
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+        _pool_size = 0
+
+atexit.register(close_pool)
+
+"""
+Search cache
+
+A single cache is shared by the searches in the process, and is saved when the process exits.
+"""
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+def get_search_cache(max_size, path=None):
+    """
+    Returns the search cache, creating it if it has not been created or has a different file.
+    """
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None or _search_cache.path != path:
+            save_search_cache()
+            _search_cache = SearchCache(max_size, path)
+        _search_cache.max_size = max_size
+        return _search_cache
+
+def save_search_cache():
+    """
+    Writes the search cache to its file, if it has been created and has one.
+    """
+    if _search_cache is not None:
+        _search_cache.save()
+
+atexit.register(save_search_cache)
@@ -0,0 +1,145 @@
+import game
+import mcts
+import agents
+import selfplay
+import random
+import argparse
+import hashlib
+import mmap
+import struct
+from game import ACTIONS, ACTION_INDEX
+
+"""
+Opening book
+
+The first rounds of a game start from the same few positions, so the policies of the search in those positions are
+computed ahead of time and stored in a table on disk. The table is memory-mapped when it is opened, and looked up
+before the computer searches.
+
+The file is a header followed by records sorted by key. The key of a record is a hash of the information key of the
+position (Game.get_information_key), and the policy is stored as the probability of each action out of 255.
+"""
+MAGIC = b"COUPBOOK"
+HEADER = struct.Struct("<8sI")
+RECORD = struct.Struct(f"<Q{len(ACTIONS)}B")
+
+def hash_key(key):
+    """
+    Returns the 64-bit hash that an information key is stored under. Unlike hash(), it is the same in every process.
+    """
+    return int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), "little")
+
+def write_book(path, policies):
+    """
+    Write a book to path from a dictionary of information keys to dictionaries of action probabilities.
+    """
+    records = []
+    for key, policy in policies.items():
+        records.append((hash_key(key), [round(policy.get(action, 0) * 255) for action in ACTIONS]))
+    records.sort()
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(records)))
+        for key, probabilities in records:
+            file.write(RECORD.pack(key, *probabilities))
+
+class OpeningBook:
+    """A book opened from disk, which is memory-mapped rather than read."""
+
+    def __init__(self, path):
+        """
+        Open the book at path.
+
+        Raises ValueError if the file is not a book.
+        """
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is not an opening book")
+        magic, self.size = HEADER.unpack_from(self.data)
+        if magic != MAGIC or len(self.data) != HEADER.size + self.size * RECORD.size:
+            raise ValueError(f"{path} is not an opening book")
+
+    def __len__(self):
+        return self.size
+
+    def get(self, key):
+        """
+        Returns the probability of each action in ACTIONS for the information key, or None if it isn't in the book.
+        """
+        key = hash_key(key)
+        low, high = 0, self.size
+        while low < high: # Binary search of the sorted records
+            middle = (low + high) // 2
+            record = RECORD.unpack_from(self.data, HEADER.size + middle * RECORD.size)
+            if record[0] < key:
+                low = middle + 1
+            elif record[0] > key:
+                high = middle
+            else:
+                return [probability / 255 for probability in record[1:]]
+        return None
+
+    def lookup(self, game, player):
+        """
+        Returns the book's probabilities of the playable actions for the player, in the same order as game.playable_actions, or None if the position isn't in the book.
+        """
+        probabilities = self.get(game.get_information_key(game.players.index(player)))
+        if probabilities is None:
+            return None
+        action_probs = [probabilities[ACTION_INDEX[action]] for action in game.playable_actions]
+        if sum(action_probs) == 0:
+            return None
+        return action_probs
+
+    def close(self):
+        """Unmap the book."""
+        self.data.close()
+
+class _RecordingAgent(agents.HeuristicAgent):
+    """Plays like the heuristic agent, and keeps a copy of each position where it had to choose between actions."""
+
+    def __init__(self, positions):
+        self.positions = positions
+
+    def choose(self, game, player):
+        """Return the action to play."""
+        if len(set(game.playable_actions)) > 1:
+            key = game.get_information_key(game.players.index(player))
+            if key not in self.positions:
+                self.positions[key] = game.clone()
+        return super().choose(game, player)
+
+def build(num_games, rounds, args, seed=0):
+    """
+    Returns the policies of the positions reached in the first rounds of num_games games between heuristic agents.
+
+    The policy of each position is the result of an MCTS search with args, which can't see the cards of the other player.
+    """
+    positions = {}
+    rng = random.Random(seed)
+    for i in range(num_games):
+        recorders = [_RecordingAgent(positions), _RecordingAgent(positions)]
+        selfplay.play_game(recorders, rng.getrandbits(64), rounds)
+
+    policies = {}
+    args = dict(args, determinize=True)
+    for key, position in positions.items():
+        action_probs = mcts.MCTS(position, args).search()
+        policies[key] = {}
+        for action, probability in zip(position.playable_actions, action_probs):
+            policies[key][action] = policies[key].get(action, 0) + probability
+    return policies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the policies of the search in the first rounds of a game.")
+    parser.add_argument("-o", "--output", help="File to write the book to", default="openings.book")
+    parser.add_argument("-n", "--games", help="Number of games to find positions in", type=int, default=1000)
+    parser.add_argument("-r", "--rounds", help="Number of rounds of each game to include", type=int, default=3)
+    parser.add_argument("--simulations", help="Number of simulations of each search", type=int, default=1000)
+    parser.add_argument("-w", "--workers", help="Number of processes each search uses", type=int, default=1)
+    parser.add_argument("-s", "--seed", help="Seed for the games", type=int, default=0)
+    args = parser.parse_args()
+
+    policies = build(args.games, args.rounds, dict(agents.DEFAULT_MCTS_ARGS, num_simulations=args.simulations, num_workers=args.workers), args.seed)
+    write_book(args.output, policies)
+    print(f"Wrote {len(policies)} positions to {args.output}")
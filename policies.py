@@ -0,0 +1,205 @@
+from game import TURN_ACTIONS
+
+"""
+Policies
+
+The hard-coded weighting of the computer's actions, and the rollout policies the MCTS plays out its leaves with.
+They are kept apart from agents.py and mcts.py so that both can use them.
+"""
+def weight_actions(game, computer, action_prob):
+    """
+    Adds the weighting of the hard-coded strategies to a dictionary of the probability of each playable action.
+
+    The weighting favours the actions of the cards the computer holds. It is used by agents.get_computer_action and WeightedRollout.
+    """
+    if game.playable_actions == TURN_ACTIONS:
+
+        # Add more weighting to actions that are legal
+        if "duke" in computer.hand:
+            action_prob['tax'] += 0.1
+        if "captain" in computer.hand:
+            action_prob['steal'] += 0.1
+        if "assassin" in computer.hand:
+            action_prob['assassinate'] += 0.1
+        if "ambassador" in computer.hand:
+            action_prob['exchange'] += 0.1
+
+        # Remove more weighting to actions that are illegal
+        if "duke" not in computer.hand:
+            action_prob['tax'] -= 0.2
+        if "captain" not in computer.hand:
+            action_prob['steal'] -= 0.2
+        if "assassin" not in computer.hand:
+            action_prob['assassinate'] -= 0.2
+        if "ambassador" not in computer.hand:
+            action_prob['exchange'] -= 0.2
+
+        # Computer more likely to assassinate if it has more than 3 coins, and has the Assassin influence.
+        if computer.coins >= 3 and "assassin" in computer.hand:
+            action_prob['assassinate'] += 0.1
+
+        # Computer is more likely to steal if player is almost able to coup.
+        if game.get_opponent(computer).coins >= 4:
+            if len(computer.hand) == 1:
+                action_prob['steal'] += 0.9
+            action_prob['steal'] += 0.1
+
+def rollout(game, max_depth):
+    """
+    Plays random playable actions on a copy of the game for max_depth steps, and returns the sum of the rewards.
+    """
+    return play_rollout(game.clone(), max_depth)
+
+def play_rollout(rollout_game, max_depth):
+    """
+    Plays random playable actions on the game itself for max_depth steps, and returns the sum of the rewards.
+    """
+    value_sum = 0
+    rollout_player = rollout_game.turn
+    rollout_opponent = rollout_game.get_opponent(rollout_player)
+    for i in range(max_depth):
+        action = rollout_game.rng.choice(rollout_game.playable_actions)
+        rollout_game.play_action(rollout_player, rollout_opponent, action)
+        winner, terminated = rollout_game.get_winner_and_terminated()
+        # Rewards
+        value_sum += rollout_player.coins
+        if len(rollout_opponent.hand) == 1:
+            value_sum += 300
+        if len(rollout_opponent.hand) == 0:
+            value_sum += 900
+
+        # Punishments
+        if rollout_opponent.coins >=7:
+            value_sum -= 100
+        else:
+            value_sum -= rollout_opponent.coins
+        if len(rollout_player.hand) == 1:
+            value_sum -= 100
+        if len(rollout_player.hand) == 0:
+            value_sum -= 300
+
+        rollout_player, rollout_opponent = rollout_opponent, rollout_player
+    return value_sum
+
+def get_step_reward(player, opponent):
+    """
+    Returns the reward of a rollout step for the player who just acted, as added up by play_rollout.
+    """
+    reward = player.coins
+    if len(opponent.hand) == 1:
+        reward += 300
+    if len(opponent.hand) == 0:
+        reward += 900
+    reward -= 100 if opponent.coins >= 7 else opponent.coins
+    if len(player.hand) == 1:
+        reward -= 100
+    if len(player.hand) == 0:
+        reward -= 300
+    return reward
+
+class UniformRollout:
+    """
+    Rollout policy that plays random playable actions for max_depth steps. This is the default.
+
+    Rollout policies are chosen with args['rollout_policy'], as a name in ROLLOUT_POLICIES or a policy object.
+    The number of steps played by a policy is counted in steps.
+    """
+    def __init__(self):
+        self.steps = 0
+
+    def play(self, rollout_game, max_depth):
+        """
+        Plays the rollout on the game itself and returns the sum of the rewards.
+        """
+        self.steps += max_depth
+        return play_rollout(rollout_game, max_depth)
+
+class WeightedRollout(UniformRollout):
+    """
+    Rollout policy that chooses the actions of the turn with the card-aware weighting of weight_actions,
+    so that players mostly claim the cards they hold. Responses are chosen at random.
+    """
+    def choose(self, game):
+        """
+        Returns the action for the player whose turn it is.
+        """
+        if game.playable_actions != TURN_ACTIONS:
+            return game.rng.choice(game.playable_actions)
+        legal_actions = game.get_legal_actions(game.turn)
+        action_prob = {action: 1 / len(legal_actions) if action in legal_actions else 0 for action in game.playable_actions}
+        weight_actions(game, game.turn, action_prob)
+        weights = [max(weight, 0) for weight in action_prob.values()]
+        if sum(weights) == 0:
+            return game.rng.choice(legal_actions)
+        return game.rng.choices(game.playable_actions, weights=weights)[0]
+
+    def is_decisive(self, game, steps):
+        """
+        Check if the rest of the rollout can be evaluated without playing it.
+        """
+        return False
+
+    def play(self, rollout_game, max_depth):
+        """
+        Plays the rollout on the game itself and returns the sum of the rewards.
+        """
+        value_sum = 0
+        rollout_player = rollout_game.turn
+        rollout_opponent = rollout_game.get_opponent(rollout_player)
+        for i in range(max_depth):
+            if self.is_decisive(rollout_game, i):
+                self.steps += i
+                return value_sum + self.evaluate(rollout_player, rollout_opponent, max_depth - i)
+            rollout_game.play_action(rollout_player, rollout_opponent, self.choose(rollout_game))
+            value_sum += get_step_reward(rollout_player, rollout_opponent)
+            rollout_player, rollout_opponent = rollout_opponent, rollout_player
+        self.steps += max_depth
+        return value_sum
+
+    def evaluate(self, rollout_player, rollout_opponent, steps):
+        """
+        Returns the rewards of the remaining steps of a rollout, as if the position stays as it is. The rollout player acts next.
+        """
+        return (steps + 1) // 2 * get_step_reward(rollout_player, rollout_opponent) + steps // 2 * get_step_reward(rollout_opponent, rollout_player)
+
+class CutoffRollout(WeightedRollout):
+    """
+    Rollout policy that stops once the game is won, or after cutoff steps, and evaluates the rest of the rollout
+    with WeightedRollout.evaluate. Actions are chosen at random, or with the card-aware weighting if weighted is True.
+    """
+    def __init__(self, cutoff=20, weighted=False):
+        super().__init__()
+        self.cutoff = cutoff
+        self.weighted = weighted
+
+    def choose(self, game):
+        """
+        Returns the action for the player whose turn it is.
+        """
+        if self.weighted:
+            return super().choose(game)
+        return game.rng.choice(game.playable_actions)
+
+    def is_decisive(self, game, steps):
+        """
+        Check if the game is won, or the rollout has reached the cutoff.
+        """
+        return game.game_won or steps >= self.cutoff
+
+ROLLOUT_POLICIES = {
+    "uniform": UniformRollout,
+    "weighted": WeightedRollout,
+    "cutoff": CutoffRollout,
+}
+
+def get_rollout_policy(policy):
+    """
+    Returns the rollout policy for args['rollout_policy'], which is a name in ROLLOUT_POLICIES, a policy, or None for UniformRollout.
+    """
+    if policy is None:
+        return UniformRollout()
+    if isinstance(policy, str):
+        if policy not in ROLLOUT_POLICIES:
+            raise ValueError(f"Unknown rollout policy: {policy}")
+        return ROLLOUT_POLICIES[policy]()
+    return policy
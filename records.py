@@ -0,0 +1,224 @@
+import mmap
+import os
+import struct
+from game import ACTIONS, ACTION_INDEX
+
+"""
+Game records
+
+Games are saved in a compact binary file, so that self-play and server games can be analysed offline or replayed.
+The file is a header followed by the games, one after another. Each game is a fixed header, holding the seed of the
+game, the number of actions, the player who acted first and the winner, followed by the index of each action in
+ACTIONS, one byte per action.
+
+The cards of a recorded game are drawn with a generator that is reseeded from the game's seed before the game is dealt
+and before each action, so that they don't depend on what the agents drew from the game's generator between actions.
+A game can then be rebuilt from its seed and its actions alone, as long as the cards that are lost or exchanged are
+chosen at random (Game.is_simulation), as they are in self-play and on the server.
+"""
+MAGIC = b"COUPGAME"
+HEADER = struct.Struct("<8s")
+GAME_HEADER = struct.Struct("<QIBB")
+UNFINISHED = 0xFFFFFFFF # Number of actions of a game that is still being written
+NO_WINNER = 255
+
+def get_seed(seed, index):
+    """
+    Returns the seed of the generator of a recorded game before the action at index is played.
+    """
+    return seed << 32 | index
+
+class GameRecord:
+    """
+    The seed and actions of a game, and its first player and winner as indices of game.players (NO_WINNER if it wasn't won).
+
+    A record is filled in by a game it is started on, or read from a file by GameReader.
+    """
+    __slots__ = ("seed", "actions", "first_player", "winner", "writer")
+
+    def __init__(self, seed, actions=b"", first_player=0, winner=NO_WINNER):
+        """
+        Initialize the record of the game with the 64-bit seed.
+        """
+        self.seed = seed
+        self.actions = actions
+        self.first_player = first_player
+        self.winner = winner
+        self.writer = None
+
+    def __len__(self):
+        return len(self.actions)
+
+    def get_actions(self):
+        """
+        Returns the names of the actions.
+        """
+        return [ACTIONS[action] for action in self.actions]
+
+    def start(self, game):
+        """
+        Record the actions played on a game that hasn't been dealt yet.
+        """
+        self.actions = bytearray()
+        game.rng.seed(self.seed)
+        game.recorder = self
+
+    def record(self, game, action):
+        """
+        Add an action that is about to be played on the game. Called by Game.play_action.
+        """
+        if not self.actions:
+            self.first_player = game.players.index(game.turn)
+        game.rng.seed(get_seed(self.seed, len(self.actions)))
+        self.actions.append(ACTION_INDEX[action])
+        if self.writer is not None:
+            self.writer.write_action(self.actions[-1])
+
+    def finish(self, game):
+        """
+        Stop recording the game, and store its winner. If the record is being written by a GameWriter, its header is completed.
+        """
+        game.recorder = None
+        self.winner = game.players.index(game.winner) if game.game_won else NO_WINNER
+        if self.writer is not None:
+            self.writer.finish(self)
+
+class GameWriter:
+    """
+    Appends games to a file, creating it if it doesn't exist.
+
+    A game started with start() is written an action at a time as it is played. A game that was still being written
+    when the file was last closed is discarded when the file is opened again.
+    """
+
+    def __init__(self, path):
+        """
+        Open the file at path.
+
+        Raises ValueError if the file isn't a file of game records.
+        """
+        self.path = path
+        self.current = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with GameReader(path) as reader:
+                end = reader.end()
+            self.file = open(path, "r+b")
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, "w+b")
+            self.file.write(HEADER.pack(MAGIC))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self, game, seed):
+        """
+        Start writing a game that hasn't been dealt yet, and return its record. The game is written until record.finish(game) is called.
+
+        Raises RuntimeError if another game is being written.
+        """
+        if self.current is not None:
+            raise RuntimeError("Another game is being written")
+        record = GameRecord(seed)
+        record.start(game)
+        record.writer = self
+        self.current = (record, self.file.tell())
+        self.file.write(GAME_HEADER.pack(seed, UNFINISHED, 0, NO_WINNER))
+        return record
+
+    def write_action(self, action):
+        """
+        Append the index of an action of the game being written.
+        """
+        self.file.write(bytes((action,)))
+
+    def finish(self, record):
+        """
+        Complete the header of the game being written.
+        """
+        record, offset = self.current
+        end = self.file.tell()
+        self.file.seek(offset)
+        self.file.write(GAME_HEADER.pack(record.seed, len(record.actions), record.first_player, record.winner))
+        self.file.seek(end)
+        record.writer = None
+        self.current = None
+
+    def write(self, record):
+        """
+        Write a whole game from its record.
+
+        Raises RuntimeError if a game is being written an action at a time.
+        """
+        if self.current is not None:
+            raise RuntimeError("Another game is being written")
+        self.file.write(GAME_HEADER.pack(record.seed, len(record.actions), record.first_player, record.winner))
+        self.file.write(record.actions)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        """Close the file. A game that is still being written is left unfinished."""
+        self.file.close()
+
+class GameReader:
+    """
+    The games of a file, which is memory-mapped rather than read, so that files of millions of games can be iterated over.
+    """
+
+    def __init__(self, path):
+        """
+        Open the file at path.
+
+        Raises ValueError if the file isn't a file of game records.
+        """
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size or HEADER.unpack_from(self.data)[0] != MAGIC:
+            self.data.close()
+            raise ValueError(f"{path} is not a file of game records")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        """
+        Yields the record of each finished game. Only the game being yielded is read from the file.
+        """
+        for offset in self.offsets():
+            seed, num_actions, first_player, winner = GAME_HEADER.unpack_from(self.data, offset)
+            start = offset + GAME_HEADER.size
+            yield GameRecord(seed, self.data[start:start + num_actions], first_player, winner)
+
+    def offsets(self):
+        """
+        Yields the offset of each finished game in the file.
+        """
+        offset = HEADER.size
+        while offset + GAME_HEADER.size <= len(self.data):
+            num_actions = GAME_HEADER.unpack_from(self.data, offset)[1]
+            if num_actions == UNFINISHED or offset + GAME_HEADER.size + num_actions > len(self.data):
+                return
+            yield offset
+            offset += GAME_HEADER.size + num_actions
+
+    def end(self):
+        """
+        Returns the offset of the end of the last finished game.
+        """
+        end = HEADER.size
+        for offset in self.offsets():
+            end = offset + GAME_HEADER.size + GAME_HEADER.unpack_from(self.data, offset)[1]
+        return end
+
+    def close(self):
+        """Unmap the file."""
+        self.data.close()
@@ -0,0 +1,156 @@
+import game
+import mcts
+import agents
+import records
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+from game import ACTIONS
+
+"""
+Replay
+
+Rebuilds the positions of recorded games (see records.py) from their seeds and actions, to reproduce bug reports and
+to search historical positions again. The games are played silently as simulations, so nothing is printed or asked for.
+
+A position is the game after its first n actions, where position 0 is the game as it was dealt. Every SNAPSHOT_INTERVAL
+actions a copy of the game is kept, so that a position is rebuilt from the nearest copy rather than from the start.
+"""
+SNAPSHOT_INTERVAL = 16
+
+class Replay:
+    """The positions of a recorded game."""
+
+    def __init__(self, record, interval=SNAPSHOT_INTERVAL):
+        self.record = record
+        self.interval = interval
+        self.snapshots = [] # The game before every interval actions
+
+    def __len__(self):
+        """Returns the number of actions, so the positions are 0 to len(replay)."""
+        return len(self.record)
+
+    def start(self):
+        """
+        Returns the game as it was dealt.
+        """
+        coup = game.Game(output=None, rng=random.Random(self.record.seed))
+        coup.is_simulation = True
+        coup.deal()
+        coup.turn = coup.players[self.record.first_player]
+        coup.reset_flags()
+        return coup
+
+    def play(self, coup, index):
+        """
+        Plays the action at index on the game, which is at that position, with Game.apply.
+
+        Raises ValueError if the action can't be played, which means the game isn't the one that was recorded.
+        """
+        action = ACTIONS[self.record.actions[index]]
+        if action not in coup.playable_actions:
+            raise ValueError(f"Action {index} ({action}) can't be played, the playable actions are {', '.join(coup.playable_actions)}")
+        coup.rng.seed(records.get_seed(self.record.seed, index))
+        coup.apply(action)
+
+    def get_position(self, position):
+        """
+        Returns the game at a position, played out from the nearest snapshot.
+
+        Raises IndexError if the position is past the end of the game.
+        """
+        if not 0 <= position <= len(self):
+            raise IndexError(f"The game has positions 0 to {len(self)}")
+        if not self.snapshots:
+            self.snapshots.append(self.start())
+        snapshot = min(position // self.interval, len(self.snapshots) - 1)
+        coup = self.snapshots[snapshot].clone()
+        coup.rng = random.Random() # Reseeded before each action
+        for index in range(snapshot * self.interval, position):
+            self.play(coup, index)
+            if (index + 1) % self.interval == 0 and (index + 1) // self.interval == len(self.snapshots):
+                self.snapshots.append(coup.clone())
+        return coup
+
+    def positions(self):
+        """
+        Yields each position and its game, in order. The game is played on between positions, so copy it to keep it.
+        """
+        coup = self.start()
+        yield 0, coup
+        for index in range(len(self)):
+            self.play(coup, index)
+            yield index + 1, coup
+
+def search_game(record, args):
+    """
+    Searches each position of a recorded game where the player acting had to choose between actions.
+
+    Returns a list of (position, action played, policy), where the policy is a dictionary of the probability MCTS.search
+    with args gives each playable action.
+    """
+    results = []
+    for position, coup in Replay(record).positions():
+        if position == len(record) or len(set(coup.playable_actions)) < 2:
+            continue
+        policy = {}
+        for action, probability in zip(coup.playable_actions, mcts.MCTS(coup, args).search()):
+            policy[action] = policy.get(action, 0) + probability
+        results.append((position, ACTIONS[record.actions[position]], policy))
+    return results
+
+def _search_game(job):
+    """
+    Search a game for the pool.
+    """
+    index, record, args = job
+    return index, search_game(record, args)
+
+def search_games(path, args, num_workers=None, limit=None):
+    """
+    Searches the positions of the games in a file of game records across a pool of worker processes, like search_game.
+
+    Yields the index of each game in the file and the results of its positions, in the order they finish. Only the
+    first limit games are searched if limit is given.
+    """
+    # Each worker runs its own searches, so the searches don't start pools of their own
+    args = dict(args, num_workers=1)
+    with records.GameReader(path) as reader:
+        jobs = ((index, record, args) for index, record in enumerate(itertools.islice(reader, limit)))
+        with multiprocessing.Pool(num_workers or os.cpu_count()) as pool:
+            yield from pool.imap_unordered(_search_game, jobs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild positions of recorded games, or search them again.")
+    parser.add_argument("path", help="File of game records")
+    parser.add_argument("-g", "--game", help="Index of the game in the file to show", type=int, default=0)
+    parser.add_argument("-p", "--position", help="Number of actions of the game to play before showing it", type=int, default=None)
+    parser.add_argument("--search", help="Search every position of every game, and show where the action played wasn't the search's choice", action="store_true")
+    parser.add_argument("-n", "--games", help="Number of games to search", type=int, default=None)
+    parser.add_argument("--simulations", help="Number of simulations of each search", type=int, default=1000)
+    parser.add_argument("-w", "--workers", help="Number of processes to search the games in", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.search:
+        search_args = dict(agents.DEFAULT_MCTS_ARGS, num_simulations=args.simulations, determinize=True)
+        for index, results in search_games(args.path, search_args, args.workers, args.games):
+            for position, played, policy in results:
+                choice = max(policy, key=policy.get)
+                if policy[played] < policy[choice]:
+                    print(f"Game {index}, position {position}: played {played} ({policy[played]:.0%}), search chose {choice} ({policy[choice]:.0%})")
+    else:
+        with records.GameReader(args.path) as reader:
+            for index, record in enumerate(reader):
+                if index == args.game:
+                    break
+            else:
+                raise SystemExit(f"{args.path} has no game {args.game}")
+        replay = Replay(record)
+        position = len(replay) if args.position is None else args.position
+        coup = replay.get_position(position)
+        print(f"Game {args.game}, position {position} of {len(replay)}: {' '.join(record.get_actions()[:position])}")
+        for player in coup.players:
+            print(f"{player.name}: {', '.join(player.hand) or 'no influences'}, {player.coins} coins")
+        print(f"{coup.turn.name} to choose from {', '.join(coup.playable_actions)}" if not coup.game_won else f"{coup.winner.name} won")
@@ -0,0 +1,246 @@
+import random
+import numpy as np
+import game
+
+"""
+Batched rollouts
+
+Plays out many random games at once, storing each game as a row of NumPy arrays instead of a Game object.
+The rules follow Game.play_action as it is played by policies.rollout: a random playable action is chosen every step
+and played with the rollout player alternating between the two players, and the same rewards are given.
+
+Cards are stored as counts in the order of game.CARDS, and actions as the indices below.
+"""
+COUP, INCOME, FOREIGN_AID, TAX, STEAL, ASSASSINATE, EXCHANGE, ALLOW, CHALLENGE, BLOCK = range(10)
+ACTIONS = game.ACTIONS
+NO_ACTION = -1
+DUKE, ASSASSIN, AMBASSADOR, CAPTAIN, CONTESSA = (game.CARDS.index(card) for card in ("duke", "assassin", "ambassador", "captain", "contessa"))
+
+# Playable actions in each phase. Rows 0-6 are the phases where an action is waiting for a response,
+# row 7 is the phase where an action is chosen, and row 8 is the phase where a block is waiting for a response.
+NO_ACTION_PHASE = 7
+BLOCKED_PHASE = 8
+_OPTIONS = np.array([
+    [ALLOW] * 7,
+    [ALLOW] * 7,
+    [ALLOW, BLOCK] + [ALLOW] * 5,
+    [ALLOW, CHALLENGE] + [ALLOW] * 5,
+    [ALLOW, CHALLENGE, BLOCK] + [ALLOW] * 4,
+    [ALLOW, CHALLENGE, BLOCK] + [ALLOW] * 4,
+    [ALLOW, CHALLENGE] + [ALLOW] * 5,
+    [COUP, INCOME, FOREIGN_AID, TAX, STEAL, ASSASSINATE, EXCHANGE],
+    [ALLOW, CHALLENGE] + [ALLOW] * 5,
+])
+_NUM_OPTIONS = np.array([1, 1, 2, 2, 3, 3, 2, 7, 2])
+
+# The card claimed by each action, which is checked when it is challenged
+_CLAIMS = np.array([0, 0, 0, DUKE, CAPTAIN, ASSASSIN, AMBASSADOR])
+
+class BatchRollout:
+    """A batch of games played out together."""
+
+    def __init__(self, coins, hands, deck, current_action, block_attempted, rollout_player, rng=None):
+        """
+        Initialize the batch from arrays with one row per game.
+
+        coins and hands are indexed by player, hands and deck hold a count for each card, and rollout_player is the index of the player who acts first.
+        """
+        self.coins = coins
+        self.hands = hands
+        self.deck = deck
+        self.current_action = current_action
+        self.block_attempted = block_attempted
+        self.rollout_player = rollout_player
+        self.value_sum = np.zeros(len(coins))
+        self.rng = rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+
+    @classmethod
+    def from_games(cls, games, repeats=1, rng=None):
+        """
+        Returns a batch holding each of the games, repeated the given number of times.
+
+        If rng is None, the batch's generator is seeded from the random generator of the first game.
+        """
+        coins, hands, deck, current_action, block_attempted, rollout_player = [], [], [], [], [], []
+        for coup in games:
+            coins.append([player.coins for player in coup.players])
+            hands.append([[player.hand.count(card) for card in game.CARDS] for player in coup.players])
+            deck.append(coup.deck.counts)
+            current_action.append(ACTIONS.index(coup.current_action) if coup.current_action else NO_ACTION)
+            block_attempted.append(coup.block_attempted)
+            rollout_player.append(coup.players.index(coup.turn))
+        if rng is None:
+            rng = np.random.default_rng(games[0].rng.getrandbits(64))
+        return cls(
+            np.repeat(np.array(coins, dtype=np.int64), repeats, axis=0),
+            np.repeat(np.array(hands, dtype=np.int64), repeats, axis=0),
+            np.repeat(np.array(deck, dtype=np.int64), repeats, axis=0),
+            np.repeat(np.array(current_action, dtype=np.int64), repeats),
+            np.repeat(np.array(block_attempted, dtype=bool), repeats),
+            np.repeat(np.array(rollout_player, dtype=np.int64), repeats),
+            rng,
+        )
+
+    def run(self, max_depth):
+        """
+        Play every game for max_depth steps and return the reward of each game.
+        """
+        for i in range(max_depth):
+            self.step()
+        return self.value_sum
+
+    def step(self):
+        """
+        Play a random playable action in every game, then add the rewards.
+        """
+        num_games = len(self.coins)
+        player = self.rollout_player
+        target = 1 - player
+
+        phase = np.where(self.block_attempted, BLOCKED_PHASE, np.where(self.current_action == NO_ACTION, NO_ACTION_PHASE, self.current_action))
+        choice = (self.rng.random(num_games) * _NUM_OPTIONS[phase]).astype(np.int64)
+        action = _OPTIONS[phase, choice]
+
+        choosing = phase == NO_ACTION_PHASE
+        blocked = phase == BLOCKED_PHASE
+        responding = ~choosing & ~blocked
+
+        # An action is chosen, or blocked
+        self.current_action = np.where(choosing, action, self.current_action)
+        self.block_attempted = self.block_attempted | (responding & (action == BLOCK))
+
+        # A blocked action is resolved
+        games = np.flatnonzero(blocked & (action == CHALLENGE))
+        if len(games):
+            self._challenge_block(games, player[games], target[games], self.current_action[games])
+
+        # An action is allowed or challenged
+        resolved = responding & (action != BLOCK)
+        allowed = resolved & (action == ALLOW)
+        games = np.flatnonzero(resolved & (action == CHALLENGE))
+        if len(games):
+            allowed[games] = self._challenge(games, player[games], target[games], self.current_action[games])
+        games = np.flatnonzero(allowed)
+        if len(games):
+            self._play(games, player[games], target[games], self.current_action[games])
+
+        # Reset flags
+        finished = resolved | blocked
+        self.current_action = np.where(finished, NO_ACTION, self.current_action)
+        self.block_attempted = self.block_attempted & ~finished
+
+        self._reward(player, target)
+        self.rollout_player = target
+
+    def _reward(self, player, target):
+        """
+        Add the rewards and punishments of policies.rollout for the player who just acted.
+        """
+        games = np.arange(len(self.coins))
+        player_coins = self.coins[games, player]
+        target_coins = self.coins[games, target]
+        player_influence = self.hands[games, player].sum(axis=1)
+        target_influence = self.hands[games, target].sum(axis=1)
+
+        # Rewards
+        self.value_sum += player_coins
+        self.value_sum += np.where(target_influence == 1, 300, 0)
+        self.value_sum += np.where(target_influence == 0, 900, 0)
+
+        # Punishments
+        self.value_sum -= np.where(target_coins >= 7, 100, target_coins)
+        self.value_sum -= np.where(player_influence == 1, 100, 0)
+        self.value_sum -= np.where(player_influence == 0, 300, 0)
+
+    def _random_card(self, counts):
+        """
+        Returns the index of a random card for each row of card counts, weighted by the counts.
+        """
+        cumulative = counts.cumsum(axis=1)
+        pick = self.rng.random(len(counts)) * cumulative[:, -1]
+        return (cumulative > pick[:, None]).argmax(axis=1)
+
+    def _lose_card(self, games, players):
+        """
+        Each player loses a random card, if they have any.
+        """
+        has_cards = self.hands[games, players].sum(axis=1) > 0
+        games, players = games[has_cards], players[has_cards]
+        if len(games):
+            self.hands[games, players, self._random_card(self.hands[games, players])] -= 1
+
+    def _redraw(self, games, players, cards):
+        """
+        Each player draws a card from the deck and returns the card they revealed, as in Game.challenge.
+        """
+        self.hands[games, players, cards] -= 1
+        drawn = self._random_card(self.deck[games])
+        self.deck[games, drawn] -= 1
+        self.hands[games, players, drawn] += 1
+        self.deck[games, cards] += 1
+
+    def _challenge(self, games, players, targets, actions):
+        """
+        Process the challenging of an action, as in Game.challenge.
+
+        Returns whether the action is still played for each game, which is when the challenge was unsuccessful.
+        """
+        claims = _CLAIMS[actions]
+        had_card = self.hands[games, players, claims] > 0
+        self._lose_card(games[had_card], targets[had_card])
+        self._redraw(games[had_card], players[had_card], claims[had_card])
+        self._lose_card(games[~had_card], players[~had_card])
+        return had_card
+
+    def _challenge_block(self, games, players, targets, actions):
+        """
+        Process the challenging of a block, as in Game.block.
+        """
+        target_hands = self.hands[games, targets]
+        player_hands = self.hands[games, players]
+        blocked = np.where(actions == ASSASSINATE, target_hands[:, CONTESSA] > 0,
+            np.where(actions == STEAL, (target_hands[:, AMBASSADOR] > 0) | (target_hands[:, CAPTAIN] > 0), False))
+        # The duke is checked against the target, but handed to the player
+        gains_duke = (actions == FOREIGN_AID) & (target_hands[:, DUKE] > 0) & (player_hands[:, DUKE] == 0)
+
+        self._lose_card(games[blocked], players[blocked])
+        self._lose_card(games[~blocked], targets[~blocked])
+        self.hands[games[gains_duke], players[gains_duke], DUKE] += 1
+
+    def _play(self, games, players, targets, actions):
+        """
+        Play the actions that were allowed.
+        """
+        coins = self.coins
+        player_coins = coins[games, players]
+        target_coins = coins[games, targets]
+        target_influence = self.hands[games, targets].sum(axis=1)
+
+        gain = np.select(
+            [actions == INCOME, actions == FOREIGN_AID, actions == TAX],
+            [1, 2, 3],
+            0,
+        )
+        couped = (actions == COUP) & (player_coins >= 7)
+        assassinated = (actions == ASSASSINATE) & (player_coins >= 3) & (target_influence > 0)
+        stolen = np.where(actions == STEAL, np.minimum(target_coins, 2), 0)
+
+        coins[games, players] += gain + stolen - 7 * couped - 3 * assassinated
+        coins[games, targets] -= stolen
+        lose = couped | assassinated
+        self._lose_card(games[lose], targets[lose])
+
+        # Exchange a random card in the hand with a random card from the deck
+        exchanging = (actions == EXCHANGE) & (self.hands[games, players].sum(axis=1) > 0)
+        games, players = games[exchanging], players[exchanging]
+        if len(games):
+            drawn = self._random_card(self.deck[games])
+            self._lose_card(games, players)
+            self.hands[games, players, drawn] += 1
+
+def simulate(coup, num_rollouts, max_depth, rng=None):
+    """
+    Returns the mean reward of num_rollouts random rollouts of the game, played out together.
+    """
+    batch = BatchRollout.from_games([coup], num_rollouts, rng)
+    return float(batch.run(max_depth).mean())
@@ -0,0 +1,221 @@
+import mcts
+import policies
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    import rollouts
+except ImportError: # NumPy is not installed
+    rollouts = None
+
+"""
+Move scheduler
+
+Searches requested by many games at the same time are run together by one thread. At each step, every running search
+walks down its tree to a leaf, the rollouts from all the leaves are played out together in one batch, and the rewards
+are passed back up each tree. Without NumPy the rollouts are played one at a time.
+
+Only the uniform rollout policy is played in batches. A batch has a fixed cost for each step of the rollouts, so small
+batches are also played one at a time, which is faster.
+
+The simulations of a search are run one at a time with the others, so the search can't be split across processes or
+threads, and isn't timed: args['num_workers'], args['num_threads'], args['stats'] and args['stats_callback'] are
+ignored. The search cache and the tree kept between searches are used as in MCTS.search.
+"""
+IGNORED_ARGS = ('num_workers', 'num_threads', 'stats', 'stats_callback')
+
+class _PendingSearch:
+    """A search that has been submitted to the scheduler, and the future its result is given to."""
+
+    def __init__(self, search, priors=None):
+        self.search = search
+        self.priors = priors
+        self.future = Future()
+        self.tree = None
+        self.simulation_games = None
+        self.deadline = None
+
+    def start(self):
+        """Prepare the tree of the search."""
+        self.tree, self.simulation_games, new_tree = self.search.prepare_tree(self.priors)
+        self.search.simulations_run = 0
+        if self.search.args.get('time_limit') is not None:
+            self.deadline = time.perf_counter() + self.search.args['time_limit'] / 1000
+
+    def is_finished(self):
+        """Check if the search has run its simulations or its time."""
+        num_simulations = self.search.args.get('num_simulations')
+        if num_simulations is not None and self.search.simulations_run >= num_simulations:
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+class MoveScheduler:
+    """
+    Runs the searches submitted from any thread together, batch_size at a time.
+
+    When no search is running, the scheduler waits up to max_wait seconds for more searches to start the batch with.
+    Each rollout is repeated rollout_batch times, and the rewards are averaged, when NumPy is installed. Steps with
+    fewer than min_batch rollouts play them one at a time instead.
+    """
+
+    def __init__(self, batch_size=512, max_wait=0.005, rollout_batch=1, min_batch=128):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.rollout_batch = rollout_batch
+        self.min_batch = min_batch
+        self.requests = queue.Queue()
+        self.running = []
+        self.steps = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, game, args):
+        """
+        Returns a future of the probabilities of the game's playable actions, as returned by MCTS.search.
+
+        The search runs args['num_simulations'] simulations or for args['time_limit'] milliseconds, like MCTS.search.
+        """
+        return self.submit_search(mcts.MCTS(game, args))
+
+    def submit_search(self, search, priors=None):
+        """
+        Returns a future of the probabilities of the playable actions of an MCTS search, which starts from its kept tree
+        or from priors like MCTS.get_root_visits. The search mustn't be used until the future is done.
+        """
+        if self.closed:
+            raise RuntimeError("The scheduler is closed")
+        pending = _PendingSearch(search, priors)
+        self.requests.put(pending)
+        return pending.future
+
+    def close(self):
+        """
+        Stop the scheduler once the searches that have been submitted are finished.
+        """
+        self.closed = True
+        self.requests.put(None)
+        self.thread.join()
+
+    def run(self):
+        """
+        Run searches until the scheduler is closed.
+        """
+        while True:
+            if not self.running:
+                # Wait for a search, then for up to max_wait for more to arrive
+                pending = self.requests.get()
+                if pending is None:
+                    return
+                self.add(pending)
+                deadline = time.perf_counter() + self.max_wait
+                while len(self.running) < self.batch_size:
+                    try:
+                        pending = self.requests.get(timeout=max(deadline - time.perf_counter(), 0))
+                    except queue.Empty:
+                        break
+                    if pending is None:
+                        self.requests.put(None)
+                        break
+                    self.add(pending)
+            else:
+                while len(self.running) < self.batch_size:
+                    try:
+                        pending = self.requests.get_nowait()
+                    except queue.Empty:
+                        break
+                    if pending is None:
+                        self.requests.put(None)
+                        break
+                    self.add(pending)
+            try:
+                self.step()
+            except Exception as e:
+                # Fail the searches rather than leave their games waiting
+                for pending in self.running:
+                    pending.future.set_exception(e)
+                self.running = []
+            self.finish()
+
+    def add(self, pending):
+        """Start a search, unless its future has been cancelled."""
+        if not pending.future.set_running_or_notify_cancel():
+            return
+        try:
+            pending.start()
+        except Exception as e:
+            pending.future.set_exception(e)
+            return
+        self.running.append(pending)
+
+    def step(self):
+        """
+        Run one simulation of every running search, playing the rollouts of all of them together.
+        """
+        leaves = []
+        for pending in self.running:
+            game_simulation = next(pending.simulation_games)
+            node, terminated = pending.tree.select_leaf(game_simulation)
+            pending.search.simulations_run += 1
+            if terminated:
+                pending.tree.backpropagate(node, pending.tree.simulate(node, game_simulation))
+            else:
+                leaves.append((pending, node, game_simulation))
+
+        if leaves:
+            for (pending, node, game_simulation), reward in zip(leaves, self.evaluate(leaves)):
+                pending.tree.backpropagate(node, pending.tree.add_reward(node, reward))
+        self.steps += 1
+
+    def evaluate(self, leaves):
+        """
+        Returns the reward of a rollout from each leaf.
+        """
+        max_depths = {pending.search.args['max_depth'] for pending, node, game_simulation in leaves}
+        uniform = all(type(pending.tree.rollout_policy) is policies.UniformRollout for pending, node, game_simulation in leaves)
+        if rollouts is None or not uniform or len(max_depths) > 1 or len(leaves) * self.rollout_batch < self.min_batch:
+            return [pending.tree.rollout_policy.play(game_simulation, pending.search.args['max_depth']) for pending, node, game_simulation in leaves]
+        batch = rollouts.BatchRollout.from_games([game_simulation for pending, node, game_simulation in leaves], self.rollout_batch)
+        rewards = batch.run(max_depths.pop())
+        return rewards.reshape(len(leaves), self.rollout_batch).mean(axis=1).tolist()
+
+    def finish(self):
+        """
+        Give the finished searches their results.
+        """
+        running = []
+        for pending in self.running:
+            if pending.is_finished():
+                pending.future.set_result(pending.search.get_action_probs(pending.search.get_root_statistics()))
+            else:
+                running.append(pending)
+        self.running = running
+
+class ScheduledSearch:
+    """
+    Stands in for an MCTS search in agents.get_computer_action, submitting the search to a scheduler.
+
+    The search cache and the tree kept between searches are used like MCTS.search and MCTS.advance. The args the
+    scheduler ignores are removed, so that a search doesn't silently run differently from what its args ask for.
+    """
+
+    def __init__(self, scheduler, game, args):
+        self.scheduler = scheduler
+        self.game = game
+        self.args = {key: value for key, value in args.items() if key not in IGNORED_ARGS}
+        self.mcts = mcts.MCTS(game, self.args)
+
+    def search(self):
+        """Returns the probability of playing each of the game's playable actions."""
+        priors = self.mcts.get_cached_statistics()
+        if priors is not None and self.mcts.is_confident(priors):
+            return self.mcts.use_statistics(priors)
+        action_probs = self.scheduler.submit_search(self.mcts, priors).result()
+        self.mcts.cache_statistics()
+        return action_probs
+
+    def advance(self, action):
+        """Moves the root of the kept tree to the child reached by playing action."""
+        self.mcts.advance(action)
@@ -0,0 +1,118 @@
+import game
+import agents
+import records
+import random
+import argparse
+import multiprocessing
+import os
+import time
+
+"""
+Headless self-play
+
+Plays complete games between two agents without printing or asking for input, and reports the throughput and win rates.
+"""
+def play_game(agent_specs, seed, max_rounds=100, record=None):
+    """
+    Play a game between the two agents and return the index of the winning agent (None for a draw), the number of moves and the number of rounds.
+
+    The game is a simulation, so cards that are lost or exchanged are chosen at random.
+    The agents can be given as descriptions for agents.make_agent, or as agents.
+    If a records.GameRecord is given, the game is recorded in it.
+    """
+    coup = game.Game(output=None, rng=random.Random(seed))
+    coup.is_simulation = True
+    if record is not None:
+        record.start(coup)
+    coup.deal()
+    players = coup.players
+    players_agents = [agents.make_agent(spec) if isinstance(spec, str) else spec for spec in agent_specs]
+    moves = 0
+
+    coup.reset_flags()
+    while not coup.game_won:
+        # A round starts with the first player's turn
+        if coup.current_action == "" and coup.turn is players[0]:
+            if coup.round >= max_rounds:
+                break
+            coup.round += 1
+        player = coup.turn
+        action = players_agents[players.index(player)].choose(coup, player)
+        coup.apply(action)
+        for agent in players_agents:
+            agent.observe(action)
+        moves += 1
+    winner = coup.winner if coup.game_won else None
+
+    if record is not None:
+        record.finish(coup)
+    return (players.index(winner) if winner else None), moves, coup.round
+
+def _play_game(job):
+    """
+    Play a game for the pool. Odd games swap the seats of the agents so that neither always moves first.
+    """
+    index, agent_specs, seed, max_rounds, recorded = job
+    record = records.GameRecord(seed) if recorded else None
+    if index % 2:
+        winner, moves, rounds = play_game(agent_specs[::-1], seed, max_rounds, record)
+        if winner is not None:
+            winner = 1 - winner
+    else:
+        winner, moves, rounds = play_game(agent_specs, seed, max_rounds, record)
+    return winner, moves, rounds, record
+
+def run(agent_specs, num_games, num_workers=None, seed=0, max_rounds=100, record_path=None):
+    """
+    Play num_games games between the two agents across a pool of worker processes.
+    If record_path is given, the games are appended to the file of game records at that path.
+
+    Returns a dictionary with the games and moves per second and the win rate of each agent.
+    """
+    rng = random.Random(seed)
+    jobs = [(index, agent_specs, rng.getrandbits(64), max_rounds, record_path is not None) for index in range(num_games)]
+    wins = [0] * len(agent_specs)
+    draws = 0
+    moves = 0
+
+    writer = records.GameWriter(record_path) if record_path is not None else None
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(num_workers or os.cpu_count()) as pool:
+        for winner, game_moves, rounds, record in pool.imap_unordered(_play_game, jobs, chunksize=max(1, num_games // 100)):
+            if writer is not None:
+                writer.write(record)
+            moves += game_moves
+            if winner is None:
+                draws += 1
+            else:
+                wins[winner] += 1
+    elapsed = time.perf_counter() - start
+    if writer is not None:
+        writer.close()
+
+    return {
+        "games": num_games,
+        "seconds": elapsed,
+        "games_per_second": num_games / elapsed,
+        "moves_per_second": moves / elapsed,
+        "win_rates": {f"{index}:{spec}": wins[index] / num_games for index, spec in enumerate(agent_specs)},
+        "draw_rate": draws / num_games,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play games between two agents without a human player.")
+    parser.add_argument("agents", nargs=2, help='Agents to play, e.g. "random", "heuristic", "mcts" or "mcts:num_simulations=200,max_depth=50"')
+    parser.add_argument("-n", "--games", help="Number of games to play", type=int, default=1000)
+    parser.add_argument("-w", "--workers", help="Number of processes to play the games in", type=int, default=None)
+    parser.add_argument("-s", "--seed", help="Seed for the games", type=int, default=0)
+    parser.add_argument("-r", "--max-rounds", help="Rounds before a game is a draw", type=int, default=100)
+    parser.add_argument("-o", "--record", help="File of game records to append the games to")
+    args = parser.parse_args()
+
+    results = run(args.agents, args.games, args.workers, args.seed, args.max_rounds, args.record)
+    print(f"Played {results['games']} games in {results['seconds']:.2f} seconds")
+    print(f"{results['games_per_second']:.1f} games/sec, {results['moves_per_second']:.1f} moves/sec")
+    for agent, win_rate in results["win_rates"].items():
+        print(f"{agent} won {win_rate:.1%}")
+    print(f"Draws: {results['draw_rate']:.1%}")
@@ -0,0 +1,289 @@
+import game
+import agents
+import records
+import scheduler
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Game server
+
+Hosts many games against the computer at once. Requests and responses are JSON objects, one per line, sent over a
+local socket or stdin and stdout. The computer's moves are searched in an executor, so a slow search in one game
+doesn't hold up the others.
+
+Requests have a "type" and, except for "new" and "metrics", the "session" they are for. Any "id" in a request is
+sent back in its response.
+    {"type": "new"}                                         Start a game, and return its session and state
+    {"type": "state", "session": 1}                         Return the state of a game
+    {"type": "move", "session": 1, "action": "tax"}         Play an action, and return the actions played and the state
+    {"type": "close", "session": 1}                         End a game
+    {"type": "metrics"}                                     Return the latency and queue depth of each game
+Failed requests return {"error": message}.
+"""
+class Session:
+    """
+    A game between a player and the computer.
+
+    The game is a simulation, so cards that are lost or exchanged are chosen at random rather than asked for.
+    """
+
+    def __init__(self, session_id, args, book=None, move_scheduler=None, recorded=False):
+        """
+        Deal a new game, with the player to act first. The computer searches with the MCTS arguments args, in the
+        move scheduler if one is given. If recorded is True, the game is recorded in record.
+        """
+        self.id = session_id
+        seed = random.getrandbits(64)
+        self.game = game.Game(output=None, rng=random.Random(seed))
+        self.game.is_simulation = True
+        self.record = None
+        if recorded:
+            self.record = records.GameRecord(seed)
+            self.record.start(self.game)
+        self.game.deal()
+        self.player, self.computer = self.game.players
+        self.game.turn = self.player
+        self.game.reset_flags()
+        self.agent = agents.MCTSAgent(args, book)
+        if move_scheduler is not None:
+            self.agent.search = scheduler.ScheduledSearch(move_scheduler, self.game, args)
+
+        # Metrics
+        self.queue_depth = 0
+        self.moves = 0
+        self.total_latency = 0
+        self.max_latency = 0
+        self.last_latency = 0
+        self.lock = asyncio.Lock()
+
+    def play(self, action):
+        """
+        Play the player's action, then the computer's actions until the player has to choose again or the game is won.
+
+        Returns the actions played as (name, action) pairs. Raises ValueError if the player can't play the action.
+        """
+        if self.game.game_won:
+            raise ValueError("The game is over")
+        if action not in self.game.get_legal_actions(self.player):
+            raise ValueError(f"Can't play {action}, choose from {', '.join(self.game.get_legal_actions(self.player))}")
+        played = [self.apply(action)]
+        while not self.game.game_won and self.game.turn is self.computer:
+            played.append(self.apply(self.agent.choose(self.game, self.computer)))
+        return played
+
+    def apply(self, action):
+        """
+        Play an action for the player whose turn it is with Game.apply, and show it to the computer's agent.
+
+        Returns the name of the player and the action.
+        """
+        name = self.game.turn.name
+        self.game.apply(action)
+        self.agent.observe(action)
+        return name, action
+
+    def state(self):
+        """
+        Returns what the player can see of the game.
+        """
+        state = self.game.get_game_state(self.player.name)
+        state["session"] = self.id
+        state["hand"] = list(state["hand"])
+        state["turn"] = state["turn"].name
+        state["playable_actions"] = self.game.get_legal_actions(self.player) if state["turn"] == self.player.name else []
+        state["winner"] = self.game.winner.name if self.game.game_won else None
+        return state
+
+    def metrics(self):
+        """
+        Returns the number of moves, the latency of the moves in milliseconds, and the number of requests that are waiting or running.
+        """
+        return {
+            "moves": self.moves,
+            "mean_latency_ms": self.total_latency / self.moves * 1000 if self.moves else 0,
+            "max_latency_ms": self.max_latency * 1000,
+            "last_latency_ms": self.last_latency * 1000,
+            "queue_depth": self.queue_depth,
+        }
+
+class Server:
+    """Sessions, and the executor the computer's moves are played in."""
+
+    def __init__(self, args, executor=None, book=None, move_scheduler=None, writer=None):
+        """
+        Initialize the server with the MCTS arguments of the computer.
+
+        If a move scheduler is given, the searches of all the sessions are run together in it. If a records.GameWriter
+        is given, each game is written to it when it is won or closed.
+        """
+        self.args = args
+        self.book = book
+        self.move_scheduler = move_scheduler
+        self.writer = writer
+        self.executor = executor if executor is not None else ThreadPoolExecutor()
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+
+    async def handle(self, request):
+        """
+        Returns the response to a request.
+        """
+        try:
+            response = await self.respond(request)
+        except KeyError as e:
+            response = {"error": f"Missing or unknown {e}"}
+        except Exception as e:
+            # Any failure is sent back, so that the client gets a response for every request
+            response = {"error": str(e) or type(e).__name__}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    async def respond(self, request):
+        match request["type"]:
+            case "new":
+                session = Session(next(self.session_ids), self.args, self.book, self.move_scheduler, self.writer is not None)
+                self.sessions[session.id] = session
+                return {"session": session.id, "state": session.state()}
+            case "state":
+                session = self.sessions[request["session"]]
+                # Wait for any move of the session, which is changing the game in the executor
+                async with session.lock:
+                    return {"state": session.state()}
+            case "move":
+                session = self.sessions[request["session"]]
+                session.queue_depth += 1
+                try:
+                    # Moves of a session are played one at a time, in the order they arrive
+                    async with session.lock:
+                        start = time.perf_counter()
+                        played = await asyncio.get_running_loop().run_in_executor(self.executor, session.play, request["action"])
+                        latency = time.perf_counter() - start
+                finally:
+                    session.queue_depth -= 1
+                session.moves += 1
+                session.total_latency += latency
+                session.max_latency = max(session.max_latency, latency)
+                session.last_latency = latency
+                if session.game.game_won:
+                    self.write_record(session)
+                return {"played": played, "state": session.state()}
+            case "close":
+                session = self.sessions[request["session"]]
+                # Wait for any move of the session, so that the whole move is recorded
+                async with session.lock:
+                    self.sessions.pop(request["session"], None)
+                    self.write_record(session)
+                return {"closed": request["session"]}
+            case "metrics":
+                return {"sessions": {session_id: session.metrics() for session_id, session in self.sessions.items()}}
+            case default:
+                raise ValueError(f"Unknown request type: {request['type']}")
+
+    def write_record(self, session):
+        """
+        Write the game of a session to the writer, if it is recorded and hasn't been written.
+        """
+        if session.record is None or not session.record.actions:
+            return
+        session.record.finish(session.game)
+        self.writer.write(session.record)
+        self.writer.flush()
+        session.record = None
+
+    async def handle_line(self, line, write):
+        """
+        Respond to a line holding a request, passing the line of the response to write.
+        """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object")
+        except ValueError as e:
+            response = {"error": f"Invalid request: {e}"}
+        else:
+            response = await self.handle(request)
+        await write(json.dumps(response) + "\n")
+
+    async def serve_connection(self, reader, writer):
+        """
+        Answer the requests of a connection to the socket until it is closed.
+        """
+        lock = asyncio.Lock()
+        async def write(line):
+            async with lock:
+                writer.write(line.encode())
+                await writer.drain()
+
+        tasks = set()
+        while line := await reader.readline():
+            if line.strip():
+                # Requests are answered concurrently, so a slow move doesn't hold up the requests of other sessions
+                task = asyncio.create_task(self.handle_line(line, write))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        writer.close()
+
+    async def serve_stdio(self):
+        """
+        Answer requests from stdin on stdout until stdin is closed.
+        """
+        loop = asyncio.get_running_loop()
+        async def write(line):
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+        tasks = set()
+        while line := await loop.run_in_executor(None, sys.stdin.readline):
+            if line.strip():
+                task = asyncio.create_task(self.handle_line(line, write))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+async def serve(server, socket=None, port=None):
+    """
+    Serve on a Unix socket at the path socket, on port of localhost, or on stdin and stdout if neither is given.
+    """
+    if socket is not None:
+        listener = await asyncio.start_unix_server(server.serve_connection, path=socket)
+    elif port is not None:
+        listener = await asyncio.start_server(server.serve_connection, "127.0.0.1", port)
+    else:
+        await server.serve_stdio()
+        return
+    async with listener:
+        await listener.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host games against the computer, with JSON requests and responses.")
+    parser.add_argument("-u", "--socket", help="Path of a Unix socket to listen on")
+    parser.add_argument("-p", "--port", help="Port of localhost to listen on", type=int)
+    parser.add_argument("--simulations", help="Number of simulations of each search", type=int, default=1000)
+    parser.add_argument("-t", "--time-limit", help="Milliseconds the computer can search for each decision", type=int, default=None)
+    parser.add_argument("-e", "--executors", help="Number of threads the computer's moves are played in", type=int, default=None)
+    parser.add_argument("-b", "--book", help="Opening book the computer plays from, made with openings.py")
+    parser.add_argument("--batch-size", help="Run the searches of up to this many sessions together in a move scheduler", type=int, default=None)
+    parser.add_argument("--max-wait", help="Milliseconds the move scheduler waits for searches to batch together", type=float, default=5)
+    parser.add_argument("-o", "--record", help="File of game records to append the games to")
+    args = parser.parse_args()
+
+    book = None
+    if args.book:
+        import openings
+        book = openings.OpeningBook(args.book)
+    search_args = dict(agents.DEFAULT_MCTS_ARGS, num_simulations=args.simulations, time_limit=args.time_limit, determinize=True, search_cache=10000)
+    move_scheduler = scheduler.MoveScheduler(args.batch_size, args.max_wait / 1000) if args.batch_size else None
+    writer = records.GameWriter(args.record) if args.record else None
+    server = Server(search_args, ThreadPoolExecutor(args.executors), book, move_scheduler, writer)
+    asyncio.run(serve(server, args.socket, args.port))
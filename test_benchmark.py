@@ -0,0 +1,16 @@
+import json
+import benchmark
+
+def test_quick_benchmark_results_are_json():
+    results = benchmark.run(quick=True)
+    assert json.loads(json.dumps(results)) == results
+    assert results["play_action"]["actions_per_second"] > 0
+    assert results["search"][0]["num_simulations"] == 100
+
+def test_compare_reports_relative_change():
+    old = {"play_action": {"actions_per_second": 100.0}, "search": [{"mean": 2.0}]}
+    new = {"play_action": {"actions_per_second": 150.0}, "search": [{"mean": 1.0}]}
+    assert benchmark.compare(old, new) == [
+        "play_action.actions_per_second: 100 -> 150 (+50.0%)",
+        "search[0].mean: 2 -> 1 (-50.0%)",
+    ]
@@ -1,4 +1,5 @@
 import pytest
+import copy
 import random
 import game
 
@@ -104,4 +105,172 @@ def test_assassinate(coup, capfd, monkeypatch):
     coup.assassinate(coup.players[0], coup.players[1])
     out, err = capfd.readouterr()
     assert out == "Player 1 assassinate Player 2!\nPlayer 2 choose a card to lose by entering the index of the card.\nPlayer 2 lost duke\n"
-    assert err == ""
\ No newline at end of file
+    assert err == ""
+
+def test_clone_is_independent():
+    coup = game.Game()
+    coup.players[0].hand = ["duke", "captain"]
+    coup.turn = coup.players[1]
+    clone = coup.clone()
+    assert clone.turn is clone.players[1]
+    clone.players[0].hand.pop()
+    clone.players[0].coins += 3
+    clone.deck.draw()
+    assert coup.players[0].hand == ["duke", "captain"]
+    assert coup.players[0].coins == 2
+    assert len(coup.deck) == 15
+
+def test_deepcopy_has_its_own_random_generator():
+    coup = game.Game(output=None, rng=random.Random(2))
+    other = copy.deepcopy(coup)
+    assert other.rng is not coup.rng
+    assert other.deck.draw(other.rng) == coup.deck.draw(coup.rng)
+    assert other.rng.getstate() == coup.rng.getstate()
+
+def test_output_sink_and_silent_simulation(capfd):
+    messages = []
+    coup = game.Game(output=messages.append)
+    coup.income(coup.players[0])
+    assert messages == ["Player gained 1 coin."]
+
+    coup.is_simulation = True
+    coup.income(coup.players[0])
+    assert messages == ["Player gained 1 coin."]
+    out, err = capfd.readouterr()
+    assert out == ""
+
+def test_state_key_ignores_round_and_deck_order():
+    coup = game.Game()
+    other = coup.clone()
+    other.round += 1
+    other.deck = game.Game.Deck(reversed(list(coup.deck)))
+    assert coup.get_state_key() == other.get_state_key()
+    other.players[0].coins += 1
+    assert coup.get_state_key() != other.get_state_key()
+
+def test_information_key_hides_other_hands():
+    coup = game.Game()
+    coup.players[0].hand = ["duke", "captain"]
+    coup.players[1].hand = ["assassin", "contessa"]
+    other = coup.clone()
+    other.players[1].hand = ["duke", "duke"]
+    assert coup.get_information_key(0) == other.get_information_key(0)
+    assert coup.get_information_key(1) != other.get_information_key(1)
+
+def test_deck_draws_by_count():
+    deck = game.Game.Deck(["duke", "duke", "contessa"])
+    assert len(deck) == 3
+    assert "duke" in deck and "captain" not in deck
+    assert deck.peek(5) and len(deck) == 3
+    deck.remove("contessa")
+    assert deck.draw() == "duke"
+    assert deck.counts == [1, 0, 0, 0, 0]
+    clone = deck.clone()
+    clone.draw()
+    assert deck.counts == [1, 0, 0, 0, 0]
+    with pytest.raises(IndexError):
+        clone.draw()
+    with pytest.raises(ValueError):
+        deck.remove("captain")
+
+def test_action_tables():
+    coup = game.Game()
+    assert coup.get_playable_actions() is game.TURN_ACTIONS
+    assert coup.get_playable_actions("steal") == ("allow", "challenge", "block")
+    assert coup.get_playable_actions("income") == ("allow",)
+    coup.playable_actions = coup.get_playable_actions()
+    player = coup.players[0]
+    assert "assassinate" not in coup.get_legal_actions(player)
+    player.coins = 3
+    assert "assassinate" in coup.get_legal_actions(player) and "coup" not in coup.get_legal_actions(player)
+    player.coins = 7
+    assert coup.get_legal_actions(player) == game.TURN_ACTIONS
+    coup.playable_actions = ["coup", "income"]
+    player.coins = 0
+    assert coup.get_legal_actions(player) == ("income",)
+
+def test_unmake_move_restores_the_game():
+    random.seed(2)
+    coup = game.Game(output=None)
+    coup.is_simulation = True
+    coup.deal()
+    coup.playable_actions = coup.get_playable_actions()
+    for i in range(300):
+        if coup.game_won:
+            break
+        before = coup.clone()
+        player = coup.turn
+        action = random.choice(coup.playable_actions)
+        record = coup.make_move(player, coup.get_opponent(player), action)
+        after = coup.clone()
+        coup.unmake_move(record)
+        assert coup.get_state_key() == before.get_state_key()
+        assert (coup.round, coup.game_won, coup.winner) == (before.round, before.game_won, before.winner)
+        assert [player.hand for player in coup.players] == [player.hand for player in before.players]
+        # Play the action again, so the test walks through a game
+        coup.players, coup.deck = after.players, after.deck
+        coup.turn, coup.winner = after.turn, after.winner
+        for name in ("round", "current_action", "playable_actions", "block_attempted", "challenge_attempted", "game_won"):
+            setattr(coup, name, getattr(after, name))
+
+def test_get_next_state_leaves_the_game():
+    coup = game.Game(output=None)
+    coup.players[0].hand = ["duke", "captain"]
+    coup.players[1].hand = ["duke"]
+    coup.current_action = "income"
+    state = coup.get_next_state(coup.players[0], "allow")
+    assert state["coins"] == 3
+    assert coup.players[0].coins == 2
+    assert coup.current_action == "income"
+    assert coup.is_simulation is False
+
+def test_get_next_state_keeps_the_random_generator():
+    coup = game.Game(output=None, rng=random.Random(3))
+    coup.deal()
+    coup.current_action = "exchange"
+    rng_state = coup.rng.getstate()
+    coup.get_next_state(coup.players[0], "allow")
+    assert coup.rng.getstate() == rng_state
+
+def test_get_next_state_restores_the_game_after_an_error(monkeypatch):
+    coup = game.Game(output=None)
+    coup.deal()
+    coup.current_action = "income"
+    key = coup.get_state_key()
+    def fail(self, name):
+        raise RuntimeError("state failed")
+    monkeypatch.setattr(game.Game, "get_game_state", fail)
+    with pytest.raises(RuntimeError):
+        coup.get_next_state(coup.players[0], "allow")
+    assert coup.get_state_key() == key
+    assert coup.is_simulation is False
+
+def test_games_with_the_same_seed_are_the_same():
+    deals = []
+    for i in range(2):
+        coup = game.Game(output=None, rng=random.Random(5))
+        coup.deal()
+        deals.append([player.hand for player in coup.players])
+    assert deals[0] == deals[1]
+    first, second = game.split_rng(random.Random(5), 2)
+    assert first.random() != second.random()
+    assert [rng.random() for rng in game.split_rng(random.Random(5), 2)] == [rng.random() for rng in game.split_rng(random.Random(5), 2)]
+
+def test_apply_plays_responses_for_the_acting_player():
+    coup = game.Game(output=None, rng=random.Random(0))
+    coup.is_simulation = True
+    coup.deal()
+    player, computer = coup.players
+    coup.turn = computer
+    coup.reset_flags()
+    assert coup.apply("foreign_aid") is computer
+    assert coup.turn is player
+    assert coup.apply("block") is computer
+    assert coup.turn is computer
+    assert coup.apply("allow") is computer
+    assert computer.coins == 2
+    assert coup.turn is player and coup.current_action == ""
+    assert coup.apply("tax") is player
+    assert coup.apply("allow") is player
+    assert player.coins == 5
+    assert coup.turn is computer
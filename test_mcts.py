@@ -0,0 +1,282 @@
+import pytest
+import threading
+import game
+import mcts
+import policies
+
+def test_search_returns_probability_per_playable_action(coup):
+    action_probs = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 100, 'max_depth': 20}).search()
+    assert len(action_probs) == len(coup.playable_actions)
+    assert sum(action_probs) == pytest.approx(1)
+
+def test_parallel_search_merges_worker_visits(coup):
+    action_probs = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 101, 'max_depth': 20, 'num_workers': 2}).search()
+    mcts.close_pool()
+    assert len(action_probs) == len(coup.playable_actions)
+    assert sum(action_probs) == pytest.approx(1)
+
+def test_advance_reuses_subtree(coup):
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 100, 'max_depth': 20})
+    search.search()
+    child = next(child for child in search.root.children if child.action == "tax")
+    visits = child.visits
+
+    coup.play_action(action="tax")
+    search.advance("tax")
+    assert search.root.visits == visits
+    search.search()
+    assert search.root.visits == visits + 100
+
+@pytest.mark.parametrize("actions", [["tax", "allow"], ["foreign_aid", "block", "allow"]])
+def test_advance_through_responses_reuses_subtree(coup, actions):
+    coup.is_simulation = True
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 200, 'max_depth': 20})
+    for action in actions:
+        search.search()
+        coup.apply(action)
+        search.advance(action)
+        assert search.root is not None
+        assert search.root.game.get_state_key() == coup.get_state_key()
+        tree, simulation_games, new_tree = search.prepare_tree()
+        assert not new_tree
+    assert coup.turn is coup.players[0]
+
+def test_advance_discards_tree_for_unexplored_action(coup):
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 1, 'max_depth': 20})
+    search.search()
+    search.advance("not_an_action")
+    assert search.root is None
+
+def test_time_limited_search_reports_simulations_run(coup):
+    search = mcts.MCTS(coup, {'C': 1.41, 'max_depth': 20, 'time_limit': 20})
+    action_probs = search.search()
+    assert search.simulations_run > 0
+    assert sum(action_probs) == pytest.approx(1)
+
+def test_simulation_limit_applies_with_time_limit(coup):
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 10, 'max_depth': 20, 'time_limit': 10000})
+    search.search()
+    assert search.simulations_run == 10
+
+def test_threaded_search_rejects_stats(coup):
+    with pytest.raises(ValueError):
+        mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 10, 'max_depth': 5, 'num_threads': 2, 'stats': True})
+
+def test_search_does_not_draw_from_the_game(coup):
+    rng_state = coup.rng.getstate()
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 10, 'max_depth': 5})
+    assert coup.rng.getstate() == rng_state
+    assert search.rng.random() == mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 10, 'max_depth': 5}).rng.random()
+
+def test_search_needs_a_limit(coup):
+    with pytest.raises(ValueError):
+        mcts.MCTS(coup, {'C': 1.41, 'max_depth': 20})
+    with pytest.raises(ValueError):
+        mcts.MCTS(coup, {'C': 1.41, 'max_depth': 20, 'num_simulations': None, 'time_limit': None})
+
+def test_transposition_table_evicts_least_recently_used():
+    table = mcts.TranspositionTable(2)
+    table.put("a", 0)
+    table.put("b", 1)
+    assert table.get("a") == 0
+    table.put("c", 2)
+    assert len(table) == 2
+    assert table.get("b") is None
+    assert table.get("a") == 0
+
+def test_nodes_in_same_position_share_statistics(coup):
+    tree = mcts.Tree(coup, {'C': 1.41, 'max_depth': 5}, mcts.TranspositionTable(100))
+    node = tree.add_node(0, 0)
+    tree.assign_slot(node, coup.clone())
+    assert tree.slot[node] == tree.slot[0]
+    tree.backpropagate(node, 1)
+    assert tree.get_visits(0) == 2
+
+def test_search_with_transposition_table(coup):
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 200, 'max_depth': 10, 'transposition_table': 1000})
+    action_probs = search.search()
+    assert sum(action_probs) == pytest.approx(1)
+    assert 0 < len(search.table) <= 1000
+
+def test_stats_are_only_collected_when_enabled(coup):
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 50, 'max_depth': 10})
+    search.search()
+    assert search.stats is None
+
+def test_stats_callback_receives_search_stats(coup):
+    received = []
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 50, 'max_depth': 10, 'stats_callback': received.append})
+    search.search()
+    assert received == [search.stats]
+    stats = search.stats.as_dict()
+    assert stats["simulations"] == 50
+    assert stats["nodes_allocated"] > 1
+    assert stats["max_tree_depth"] >= 1
+    assert stats["rollouts"] > 0
+    assert stats["average_rollout_length"] == 10
+    assert stats["clones"] >= stats["rollouts"]
+    assert stats["clone_bytes"] > 0
+
+def test_backpropagate_updates_every_ancestor(coup):
+    tree = mcts.Tree(coup, {'C': 1.41, 'max_depth': 5})
+    node = 0
+    game_simulation = coup.clone()
+    for depth in range(3):
+        node = tree.expand(node, game_simulation)
+    tree.backpropagate(node, 5)
+    while node >= 0:
+        assert tree.get_visits(node) == 1
+        assert tree.value_sum[tree.slot[node]] == 5
+        node = tree.parent[node]
+
+def test_children_are_allocated_together(coup):
+    tree = mcts.Tree(coup, {'C': 1.41, 'max_depth': 5})
+    child = tree.expand(0, coup.clone())
+    assert tree.first_child[0] == child
+    assert tree.num_children[0] == len(coup.get_legal_actions(coup.turn))
+    assert list(tree.get_children(0)) == [child]
+    assert not tree.is_fully_expanded(0)
+
+def test_advance_keeps_only_the_subtree(coup):
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 200, 'max_depth': 5})
+    search.search()
+    size = len(search.tree)
+    child = max(search.root.children, key=lambda child: child.visits)
+    visits = child.visits
+    search.advance(child.action)
+    assert len(search.tree) < size
+    assert search.root.visits == visits
+    assert search.tree.parent[0] == -1
+
+def test_node_game_is_played_out_from_the_root(coup):
+    tree = mcts.Tree(coup, {'C': 1.41, 'max_depth': 5})
+    game_simulation = coup.clone()
+    child = tree.expand(0, game_simulation)
+    node = mcts.Node(tree, child)
+    assert node.game.get_state_key() == game_simulation.get_state_key()
+    assert node.game is not coup
+    assert coup.current_action == ""
+
+def test_node_game_plays_responses_for_the_acting_player(coup):
+    coup.is_simulation = True
+    tree = mcts.Tree(coup, {'C': 1.41, 'max_depth': 5})
+    expected = coup.clone()
+    node = 0
+    for action in ["foreign_aid", "block", "allow", "tax", "allow", "income", "allow"]:
+        node = tree.add_node(node, game.ACTION_INDEX[action])
+        expected.apply(action)
+        assert mcts.Node(tree, node).game.get_state_key() == expected.get_state_key()
+
+def test_determinizations_keep_what_the_observer_can_see(coup):
+    unseen = sorted(coup.players[0].hand + list(coup.deck))
+    samples = mcts.determinizations(coup, 1)
+    hands = set()
+    for i in range(20):
+        sample = next(samples)
+        assert sample.players[1].hand == ["assassin", "contessa"]
+        assert len(sample.players[0].hand) == 2
+        assert sorted(sample.players[0].hand + list(sample.deck)) == unseen
+        assert sample.get_information_key(1) == coup.get_information_key(1)
+        hands.add(tuple(sorted(sample.players[0].hand)))
+    assert len(hands) > 1
+    assert coup.players[0].hand == ["duke", "captain"]
+
+def test_determinized_search(coup):
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 100, 'max_depth': 10, 'determinize': True})
+    action_probs = search.search()
+    assert sum(action_probs) == pytest.approx(1)
+    coup.players[0].hand = ["contessa", "contessa"]
+    search.search()
+    assert search.root.visits > 100
+
+def test_search_cache_is_saved_and_loaded(tmp_path):
+    cache = mcts.SearchCache(2, tmp_path / "cache")
+    cache.put("a", {"income": (3, 1.5)})
+    cache.put("b", {"tax": (1, 0)})
+    cache.save()
+    loaded = mcts.SearchCache(1, tmp_path / "cache")
+    assert len(loaded) == 1
+    assert loaded.get("b") == {"tax": (1, 0)}
+
+def test_search_cache_is_shared_by_threads():
+    cache = mcts.SearchCache(8)
+    def use(thread):
+        for i in range(2000):
+            cache.put((thread, i % 16), {"income": (i, 0)})
+            cache.get((thread, (i + 1) % 16))
+    threads = [threading.Thread(target=use, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) == 8
+
+def test_search_returns_confident_cached_result(coup, monkeypatch):
+    monkeypatch.setattr(mcts, "_search_cache", None)
+    args = {'C': 1.41, 'num_simulations': 50, 'max_depth': 10, 'search_cache': 10, 'search_cache_confidence': 0.9}
+    search = mcts.MCTS(coup, args)
+    action_probs = search.search()
+    assert search.simulations_run == 50
+    statistics = mcts.get_search_cache(10).get(search.get_cache_key())
+    assert sum(visits for visits, value_sum in statistics.values()) == 50
+
+    # Not confident, so the search starts from the cached result
+    priors = {action: (10, 0) for action in coup.get_legal_actions(coup.turn)}
+    mcts.get_search_cache(10).put(search.get_cache_key(), priors)
+    search = mcts.MCTS(coup, args)
+    search.search()
+    assert search.simulations_run == 50
+    assert search.root.visits == 10 * len(priors) + 50
+
+    mcts.get_search_cache(10).put(search.get_cache_key(), {"income": (95, 0), "tax": (5, 0)})
+    search = mcts.MCTS(coup, args)
+    action_probs = search.search()
+    assert search.simulations_run == 0
+    assert action_probs[coup.playable_actions.index("income")] == pytest.approx(0.95)
+
+def test_rollout_policies(coup):
+    assert isinstance(policies.get_rollout_policy(None), policies.UniformRollout)
+    with pytest.raises(ValueError):
+        policies.get_rollout_policy("unknown")
+
+    coup.is_simulation = True
+    policy = policies.CutoffRollout(cutoff=5)
+    policy.play(coup.clone(), 100)
+    assert policy.steps == 5
+    policy = policies.WeightedRollout()
+    policy.play(coup.clone(), 20)
+    assert policy.steps == 20
+
+    for name in policies.ROLLOUT_POLICIES:
+        action_probs = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 50, 'max_depth': 20, 'rollout_policy': name}).search()
+        assert sum(action_probs) == pytest.approx(1)
+
+def test_cutoff_evaluates_the_position_as_it_stands(coup):
+    policy = policies.CutoffRollout(cutoff=0)
+    assert policy.play(coup.clone(), 3) == 2 * policies.get_step_reward(coup.turn, coup.get_opponent(coup.turn)) + policies.get_step_reward(coup.get_opponent(coup.turn), coup.turn)
+    assert policy.steps == 0
+
+def test_seeded_search_is_reproducible(coup):
+    args = {'C': 1.41, 'num_simulations': 50, 'max_depth': 10, 'seed': 3}
+    results = [mcts.MCTS(coup, args).search() for i in range(2)]
+    assert results[0] == results[1]
+    assert mcts.MCTS(coup, dict(args, num_workers=2)).search() == mcts.MCTS(coup, dict(args, num_workers=2)).search()
+
+def test_virtual_loss_is_removed_after_backpropagation(coup):
+    tree = mcts.Tree(coup, {'C': 1.41, 'max_depth': 5})
+    node, terminated = tree.select_leaf_shared(coup.clone(), 10)
+    assert tree.get_visits(0) == tree.get_visits(node) == 1
+    assert tree.value_sum[tree.slot[node]] == 10
+    tree.backpropagate_shared(node, 5, 10)
+    assert tree.get_visits(0) == tree.get_visits(node) == 1
+    assert tree.value_sum[tree.slot[node]] == 10
+    assert tree.value_sum[tree.slot[0]] == 5
+    assert not any(tree.pending)
+
+def test_threaded_search_shares_one_tree(coup):
+    search = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 200, 'max_depth': 20, 'num_threads': 4, 'determinize': True})
+    action_probs = search.search()
+    assert sum(action_probs) == pytest.approx(1)
+    assert search.simulations_run == 200
+    assert search.root.visits == 200
+    assert not any(search.tree.pending)
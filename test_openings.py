@@ -0,0 +1,42 @@
+import pytest
+import agents
+import openings
+
+@pytest.fixture
+def dealt(deal):
+    return deal()
+
+def test_book_lookup(dealt, tmp_path):
+    key = dealt.get_information_key(0)
+    policies = {key: {"income": 0.25, "tax": 0.75}, ("unknown",): {"coup": 1}}
+    openings.write_book(tmp_path / "openings.book", policies)
+    book = openings.OpeningBook(tmp_path / "openings.book")
+    assert len(book) == 2
+    action_probs = book.lookup(dealt, dealt.players[0])
+    assert action_probs[dealt.playable_actions.index("tax")] == pytest.approx(0.75, abs=0.01)
+    assert sum(action_probs) == pytest.approx(1, abs=0.01)
+    assert book.lookup(dealt, dealt.players[1]) is None
+    book.close()
+
+def test_book_is_used_before_searching(dealt, tmp_path):
+    class Search:
+        def search(self):
+            raise AssertionError("searched a position in the book")
+
+    openings.write_book(tmp_path / "openings.book", {dealt.get_information_key(0): {"foreign_aid": 1}})
+    book = openings.OpeningBook(tmp_path / "openings.book")
+    assert agents.get_computer_action(dealt, dealt.players[0], Search(), book) == "foreign_aid"
+    book.close()
+
+def test_build_covers_the_first_decision(dealt, tmp_path):
+    policies = openings.build(2, 1, {'C': 1.41, 'num_simulations': 10, 'max_depth': 5})
+    assert policies
+    for policy in policies.values():
+        assert sum(policy.values()) == pytest.approx(1)
+    openings.write_book(tmp_path / "openings.book", policies)
+    assert len(openings.OpeningBook(tmp_path / "openings.book")) == len(policies)
+
+def test_other_files_are_rejected(tmp_path):
+    (tmp_path / "notes.txt").write_bytes(b"not a book, just some notes")
+    with pytest.raises(ValueError):
+        openings.OpeningBook(tmp_path / "notes.txt")
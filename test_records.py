@@ -0,0 +1,110 @@
+import pytest
+import asyncio
+import time
+import game
+import records
+import selfplay
+import server
+
+def test_games_are_written_as_they_are_played(tmp_path):
+    path = tmp_path / "games.rec"
+    with records.GameWriter(path) as writer:
+        coup = game.Game(output=None)
+        coup.is_simulation = True
+        record = writer.start(coup, 5)
+        coup.deal()
+        coup.play_action(action="tax")
+        coup.play_action(coup.players[0], coup.players[1], "challenge")
+        writer.flush()
+        with records.GameReader(path) as reader:
+            assert list(reader) == []
+        record.finish(coup)
+        writer.write(records.GameRecord(6, bytes([0, 7]), 1))
+
+    with records.GameReader(path) as reader:
+        games = list(reader)
+    assert [game_record.seed for game_record in games] == [5, 6]
+    assert games[0].get_actions() == ["tax", "challenge"]
+    assert games[1].get_actions() == ["coup", "allow"]
+    assert games[1].first_player == 1
+    assert games[1].winner == records.NO_WINNER
+
+def test_unfinished_game_is_discarded(tmp_path):
+    path = tmp_path / "games.rec"
+    writer = records.GameWriter(path)
+    writer.write(records.GameRecord(1, bytes([1, 7])))
+    coup = game.Game(output=None)
+    writer.start(coup, 2)
+    coup.deal()
+    coup.play_action(action="income")
+    writer.close()
+
+    with records.GameWriter(path) as writer:
+        writer.write(records.GameRecord(3, bytes([2, 7])))
+    with records.GameReader(path) as reader:
+        assert [game_record.seed for game_record in reader] == [1, 3]
+
+def test_cards_do_not_depend_on_what_agents_draw():
+    draws = []
+    for agent_draws in range(2):
+        coup = game.Game(output=None)
+        record = records.GameRecord(7)
+        record.start(coup)
+        coup.deal()
+        for i in range(agent_draws):
+            coup.rng.random()
+        coup.play_action(action="income")
+        draws.append(coup.rng.random())
+    assert draws[0] == draws[1]
+
+def test_selfplay_records_every_game(tmp_path):
+    path = tmp_path / "games.rec"
+    selfplay.run(["random", "random"], 4, num_workers=1, max_rounds=10, record_path=path)
+    with records.GameReader(path) as reader:
+        games = list(reader)
+    assert len(games) == 4
+    assert all(len(game_record) > 0 for game_record in games)
+
+def test_server_writes_closed_games(tmp_path):
+    path = tmp_path / "games.rec"
+    async def run():
+        writer = records.GameWriter(path)
+        host = server.Server({'C': 1.41, 'num_simulations': 10, 'max_depth': 5}, writer=writer)
+        await host.handle({"type": "new"})
+        await host.handle({"type": "move", "session": 1, "action": "income"})
+        await host.handle({"type": "close", "session": 1})
+        writer.close()
+    asyncio.run(run())
+    with records.GameReader(path) as reader:
+        games = list(reader)
+    assert len(games) == 1
+    assert games[0].get_actions()[:2] == ["income", "allow"]
+
+def test_reader_rejects_other_files(tmp_path):
+    path = tmp_path / "games.rec"
+    path.write_bytes(b"not a record")
+    with pytest.raises(ValueError):
+        records.GameReader(path)
+
+def test_server_records_the_whole_move_before_closing(tmp_path, monkeypatch):
+    path = tmp_path / "games.rec"
+    play_move = server.Session.play
+    def slow_play(self, action):
+        time.sleep(0.05)
+        return play_move(self, action)
+    monkeypatch.setattr(server.Session, "play", slow_play)
+
+    async def run():
+        writer = records.GameWriter(path)
+        host = server.Server({'C': 1.41, 'num_simulations': 10, 'max_depth': 5}, writer=writer)
+        await host.handle({"type": "new"})
+        move = asyncio.create_task(host.handle({"type": "move", "session": 1, "action": "tax"}))
+        await asyncio.sleep(0.01)
+        closed = await host.handle({"type": "close", "session": 1})
+        writer.close()
+        return await move, closed
+    move, closed = asyncio.run(run())
+    assert closed == {"closed": 1}
+    with records.GameReader(path) as reader:
+        games = list(reader)
+    assert games[0].get_actions() == [action for name, action in move["played"]]
@@ -0,0 +1,49 @@
+import pytest
+import agents
+import records
+import replay
+import selfplay
+
+class _CapturingAgent(agents.HeuristicAgent):
+    """Plays like the heuristic agent, and keeps the game it plays in."""
+
+    def choose(self, game, player):
+        self.game = game
+        return super().choose(game, player)
+
+def play_recorded_game(seed, max_rounds=100):
+    record = records.GameRecord(seed)
+    agent = _CapturingAgent()
+    selfplay.play_game([agent, agents.RandomAgent()], seed, max_rounds, record)
+    return record, agent.game
+
+def test_replay_rebuilds_the_recorded_game():
+    for seed in range(10):
+        record, coup = play_recorded_game(seed)
+        replayed = replay.Replay(record).get_position(len(record))
+        assert [(player.coins, player.hand) for player in replayed.players] == [(player.coins, player.hand) for player in coup.players]
+        assert replayed.deck.counts == coup.deck.counts
+        assert replayed.game_won == coup.game_won
+
+def test_positions_are_rebuilt_from_snapshots():
+    record, coup = play_recorded_game(3)
+    game_replay = replay.Replay(record, interval=4)
+    keys = [position.get_state_key() for index, position in replay.Replay(record).positions()]
+    for position in [len(record), 0, 9, 4, len(record) - 1]:
+        assert game_replay.get_position(position).get_state_key() == keys[position]
+    assert len(game_replay.snapshots) == len(record) // 4 + 1
+    with pytest.raises(IndexError):
+        game_replay.get_position(len(record) + 1)
+
+def test_replay_rejects_actions_that_cannot_be_played():
+    with pytest.raises(ValueError):
+        replay.Replay(records.GameRecord(0, bytes([7]))).get_position(1)
+
+def test_search_game_searches_each_decision():
+    record, coup = play_recorded_game(1, max_rounds=2)
+    results = replay.search_game(record, {'C': 1.41, 'num_simulations': 10, 'max_depth': 5})
+    assert results
+    for position, played, policy in results:
+        assert played == record.get_actions()[position]
+        assert played in policy
+        assert sum(policy.values()) <= 1 + 1e-9
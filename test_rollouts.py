@@ -0,0 +1,31 @@
+import pytest
+import mcts
+import policies
+
+np = pytest.importorskip("numpy")
+import rollouts
+
+def test_from_games_encodes_state(coup):
+    coup.play_action(action="steal")
+    batch = rollouts.BatchRollout.from_games([coup], repeats=3)
+    assert batch.coins.tolist() == [[2, 2]] * 3
+    assert batch.hands[0].tolist() == [[1, 0, 0, 1, 0], [0, 1, 0, 0, 1]]
+    assert batch.deck[0].tolist() == [2, 2, 3, 2, 2]
+    assert batch.current_action.tolist() == [rollouts.STEAL] * 3
+    assert batch.rollout_player.tolist() == [0] * 3
+
+def test_batch_rollouts_keep_counts_valid(coup):
+    batch = rollouts.BatchRollout.from_games([coup], repeats=500, rng=np.random.default_rng(0))
+    batch.run(50)
+    assert (batch.coins >= 0).all()
+    assert (batch.hands >= 0).all()
+    assert (batch.deck >= 0).all()
+
+def test_batch_rewards_match_python_rollouts(coup):
+    rewards = [policies.rollout(coup, 5) for i in range(5000)]
+    batch_reward = rollouts.simulate(coup, 5000, 5, rng=np.random.default_rng(0))
+    assert batch_reward == pytest.approx(sum(rewards) / len(rewards), rel=0.05)
+
+def test_search_with_batched_rollouts(coup):
+    action_probs = mcts.MCTS(coup, {'C': 1.41, 'num_simulations': 20, 'max_depth': 10, 'rollout_batch': 16}).search()
+    assert sum(action_probs) == pytest.approx(1)
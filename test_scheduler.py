@@ -0,0 +1,57 @@
+import pytest
+import threading
+import scheduler
+
+ARGS = {'C': 1.41, 'num_simulations': 30, 'max_depth': 10}
+
+@pytest.fixture
+def games(deal):
+    return [deal(seed) for seed in range(4)]
+
+def test_searches_are_run_together(games):
+    move_scheduler = scheduler.MoveScheduler(batch_size=4, max_wait=1)
+    futures = [move_scheduler.submit(coup, ARGS) for coup in games]
+    for coup, future in zip(games, futures):
+        action_probs = future.result(timeout=10)
+        assert len(action_probs) == len(coup.playable_actions)
+        assert sum(action_probs) == pytest.approx(1)
+    # Every search ran its simulations in the same steps
+    assert move_scheduler.steps == ARGS['num_simulations']
+    move_scheduler.close()
+
+def test_searches_from_threads(games):
+    move_scheduler = scheduler.MoveScheduler(batch_size=2, max_wait=0)
+    results = {}
+    def search(index):
+        results[index] = scheduler.ScheduledSearch(move_scheduler, games[index], ARGS).search()
+    threads = [threading.Thread(target=search, args=(index,)) for index in range(len(games))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    move_scheduler.close()
+    assert sorted(results) == [0, 1, 2, 3]
+    with pytest.raises(RuntimeError):
+        move_scheduler.submit(games[0], ARGS)
+
+def test_failed_search_returns_error(games):
+    move_scheduler = scheduler.MoveScheduler(max_wait=0)
+    with pytest.raises(KeyError):
+        move_scheduler.submit(games[0], {'C': 1.41, 'num_simulations': 1}).result(timeout=10)
+    move_scheduler.close()
+
+def test_scheduled_search_keeps_its_tree_and_uses_the_cache(games, tmp_path):
+    move_scheduler = scheduler.MoveScheduler(max_wait=0, min_batch=1)
+    # A cache with its own file, so it doesn't hold the results of other tests
+    args = dict(ARGS, search_cache=10, search_cache_path=str(tmp_path / "cache"), stats=True)
+    search = scheduler.ScheduledSearch(move_scheduler, games[0], args)
+    assert 'stats' not in search.args
+    search.search()
+    assert search.mcts.root.visits == ARGS['num_simulations']
+    assert search.mcts.get_cached_statistics() == search.mcts.statistics
+
+    # A new search of the same position starts from the cached result
+    search = scheduler.ScheduledSearch(move_scheduler, games[0], args)
+    search.search()
+    assert search.mcts.root.visits == 2 * ARGS['num_simulations']
+    move_scheduler.close()
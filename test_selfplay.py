@@ -0,0 +1,33 @@
+import pytest
+import agents
+import selfplay
+
+def test_make_agent_parses_mcts_arguments():
+    agent = agents.make_agent("mcts:num_simulations=20,C=2.0")
+    assert agent.args['num_simulations'] == 20
+    assert agent.args['C'] == 2.0
+    assert agent.args['num_workers'] == 1
+    with pytest.raises(ValueError):
+        agents.make_agent("unknown")
+
+def test_heuristic_agent_responds_with_seven_coins(coup):
+    computer = coup.players[1]
+    computer.coins = 7
+    coup.turn = coup.players[0]
+    coup.reset_flags()
+    coup.apply("steal")
+    for i in range(20):
+        assert agents.HeuristicAgent().choose(coup, computer) in coup.playable_actions
+
+def test_play_game_is_reproducible():
+    result = selfplay.play_game(["random", "heuristic"], seed=1)
+    assert result == selfplay.play_game(["random", "heuristic"], seed=1)
+    winner, moves, rounds = result
+    assert winner in (0, 1)
+    assert moves > 0
+
+def test_run_reports_throughput_and_win_rates():
+    results = selfplay.run(["random", "mcts:num_simulations=5,max_depth=5"], num_games=4, num_workers=2)
+    assert results["games"] == 4
+    assert results["games_per_second"] > 0
+    assert sum(results["win_rates"].values()) + results["draw_rate"] == pytest.approx(1)
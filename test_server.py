@@ -0,0 +1,106 @@
+import asyncio
+import json
+import random
+import time
+import server
+
+ARGS = {'C': 1.41, 'num_simulations': 10, 'max_depth': 5}
+
+def test_session_plays_until_the_player_chooses_again():
+    random.seed(0)
+    responses = asyncio.run(play([{"type": "new"}, {"type": "move", "session": 1, "action": "income", "id": 7}]))
+    state = responses[1]["state"]
+    assert responses[1]["id"] == 7
+    assert responses[1]["played"][:2] == [["Player", "income"], ["Computer", "allow"]]
+    assert state["turn"] == "Player"
+    assert state["playable_actions"]
+    assert len(state["hand"]) == 2
+
+def test_invalid_requests_return_errors():
+    responses = asyncio.run(play([
+        {"type": "new"},
+        {"type": "move", "session": 1, "action": "coup"},
+        {"type": "move", "session": 2, "action": "income"},
+        {"type": "unknown"},
+    ]))
+    assert all("error" in response for response in responses[1:])
+
+def test_metrics():
+    responses = asyncio.run(play([
+        {"type": "new"},
+        {"type": "move", "session": 1, "action": "income"},
+        {"type": "metrics"},
+        {"type": "close", "session": 1},
+        {"type": "metrics"},
+    ]))
+    metrics = responses[2]["sessions"]["1"]
+    assert metrics["moves"] == 1
+    assert metrics["mean_latency_ms"] > 0
+    assert metrics["queue_depth"] == 0
+    assert responses[4]["sessions"] == {}
+
+def test_unexpected_errors_are_returned(monkeypatch):
+    def fail(self, action):
+        raise RuntimeError("search failed")
+    monkeypatch.setattr(server.Session, "play", fail)
+    responses = asyncio.run(play([{"type": "new"}, {"type": "move", "session": 1, "action": "income", "id": 3}]))
+    assert responses[1] == {"error": "search failed", "id": 3}
+
+def test_state_waits_for_a_move(monkeypatch):
+    play_move = server.Session.play
+    def slow_play(self, action):
+        time.sleep(0.05)
+        return play_move(self, action)
+    monkeypatch.setattr(server.Session, "play", slow_play)
+
+    async def run():
+        coup_server = server.Server(ARGS)
+        await coup_server.handle({"type": "new"})
+        move = asyncio.create_task(coup_server.handle({"type": "move", "session": 1, "action": "income"}))
+        await asyncio.sleep(0.01)
+        state = await coup_server.handle({"type": "state", "session": 1})
+        return await move, state
+    move, state = asyncio.run(run())
+    assert state["state"] == move["state"]
+
+def test_serve_on_socket(tmp_path):
+    async def run():
+        coup_server = server.Server(ARGS)
+        listener = asyncio.create_task(server.serve(coup_server, socket=str(tmp_path / "coup.sock")))
+        while not (tmp_path / "coup.sock").exists():
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(str(tmp_path / "coup.sock"))
+        writer.write(b'{"type": "new"}\n{"type": "new"}\nnot json\n')
+        responses = [json.loads(await reader.readline()) for i in range(3)]
+        writer.close()
+        listener.cancel()
+        return responses
+
+    responses = asyncio.run(run())
+    assert sorted(response.get("session", 0) for response in responses) == [0, 1, 2]
+    assert any("error" in response for response in responses)
+
+async def play(requests):
+    """Returns the responses to the requests, sent one at a time, through the JSON encoding."""
+    coup_server = server.Server(ARGS)
+    responses = []
+    for request in requests:
+        lines = []
+        async def write(line):
+            lines.append(line)
+        await coup_server.handle_line(json.dumps(request), write)
+        responses.append(json.loads(lines[0]))
+    return responses
+
+def test_sessions_share_a_move_scheduler():
+    async def run():
+        move_scheduler = server.scheduler.MoveScheduler(max_wait=0)
+        coup_server = server.Server(ARGS, move_scheduler=move_scheduler)
+        await coup_server.handle({"type": "new"})
+        await coup_server.handle({"type": "new"})
+        responses = await asyncio.gather(*(coup_server.handle({"type": "move", "session": session, "action": "income"}) for session in (1, 2)))
+        move_scheduler.close()
+        return responses
+
+    for response in asyncio.run(run()):
+        assert response["played"][0] == ("Player", "income")